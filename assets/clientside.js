@@ -0,0 +1,94 @@
+/*
+ * Client-side callbacks of the app.
+ *
+ * In client-side mode, the year labels and the year switching of the maps
+ * are done in the browser using the data sent once through the `gdp-store`
+ * component, so moving a slider does not make a request to the server. The
+ * map playback in Tab 1 uses the same data in both modes.
+ */
+
+/*
+ * Returns the year with data nearest to a year, like DataMatrix.nearest_year.
+ */
+function nearestYear(year, store) {
+    if (store.z[String(year)] !== undefined) {
+        return year;
+    }
+    var years = Object.keys(store.z).map(Number);
+    if (typeof year !== 'number' || isNaN(year)) {
+        return Math.max.apply(null, years);
+    }
+    return years.reduce(function (nearest, other) {
+        var distance = Math.abs(other - year);
+        var best = Math.abs(nearest - year);
+        return distance < best || (distance === best && other < nearest) ?
+            other : nearest;
+    });
+}
+
+function mapFigure(colorstyle) {
+    return function (year, store) {
+        year = nearestYear(year, store);
+        var template = store.templates[colorstyle];
+        var trace = Object.assign({}, template.data[0],
+                                  {z: store.z[String(year)]});
+        var layout = Object.assign({}, template.layout,
+                                   {title: store.title.replace('{}', year)});
+        return {data: [trace], layout: layout};
+    };
+}
+
+/*
+ * Plays the map in Tab 1 from the current year to the last one.
+ *
+ * The play button starts and pauses the playback, and every tick of the
+ * interval shows the next year. The slider is only moved when the playback
+ * stops, so that the frames do not trigger any server callback.
+ */
+function play(n_clicks, n_intervals, state, sliderYear, store) {
+    var noUpdate = window.dash_clientside.no_update;
+    var triggered = window.dash_clientside.callback_context.triggered.map(
+        function (trigger) { return trigger.prop_id; });
+    var playing = Boolean(state && state.playing);
+
+    if (triggered.indexOf('play-button.n_clicks') !== -1) {
+        if (playing) {
+            return [noUpdate, noUpdate, state.year, true, 'Play',
+                    {playing: false, year: state.year}];
+        }
+        return [noUpdate, noUpdate, noUpdate, false, 'Pause',
+                {playing: true, year: sliderYear, start: sliderYear}];
+    }
+
+    if (!playing || !store) {
+        // the frames are still being loaded
+        return [noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, noUpdate];
+    }
+    var years = Object.keys(store.z).map(Number);
+    var first = Math.min.apply(null, years);
+    var last = Math.max.apply(null, years);
+    var year = state.year + 1;
+    var start = state.start;
+    if (year > last) {
+        if (state.year !== start) {
+            return [noUpdate, noUpdate, state.year, true, 'Play',
+                    {playing: false, year: state.year}];
+        }
+        // started at the last year, so play from the beginning
+        year = first;
+        start = first;
+    }
+    return [mapFigure('0')(year, store), String(year), noUpdate, noUpdate,
+            noUpdate, {playing: true, year: year, start: start}];
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    gdp: {
+        year_label: function (year) {
+            return String(year);
+        },
+        world_map: mapFigure('0'),
+        comparison_map: mapFigure('1'),
+        play: play
+    }
+});
@@ -0,0 +1,256 @@
+'''Benchmarks the Dash callbacks of the dashboard.
+
+Every callback is called directly and through the `_dash-update-component`
+endpoint with the Flask test client, and the latency percentiles, peak
+allocations and serialized payload sizes are reported. The inputs are drawn
+from a seeded random generator so that runs are comparable.
+
+Usage
+-----
+    python benchmarks/bench_callbacks.py
+    python benchmarks/bench_callbacks.py --synthetic 10 --output run.json
+    python benchmarks/bench_callbacks.py --compare run.json
+'''
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_synthetic_csv(scale):
+    '''Writes a synthetic GDP csv with `scale` times as many countries.
+
+    The real rows are kept, and copies of them with scaled values and new
+    country codes are added, so that the format matches GDP-clean.csv.
+
+    Parameters
+    ----------
+    scale : int
+        The number of times the countries of GDP-clean.csv are repeated.
+
+    Returns
+    -------
+    str
+        Return the path of the synthetic csv
+    '''
+    df = pd.read_csv(os.path.join(ROOT, 'GDP-clean.csv'))
+    df = df.dropna(subset=['Country Code'])
+    rng = np.random.RandomState(0)
+    year_columns = [column for column in df.columns if column.isdigit()]
+    copies = [df]
+    for i in range(1, scale):
+        copy = df.copy()
+        copy['Country Code'] = copy['Country Code'] + str(i)
+        copy['Country Name'] = copy['Country Name'] + ' ' + str(i)
+        copy[year_columns] *= rng.uniform(0.5, 2, size=(len(copy), 1))
+        copies.append(copy)
+    path = os.path.join(tempfile.mkdtemp(),
+                        'GDP-synthetic-x{}.csv'.format(scale))
+    pd.concat(copies).to_csv(path, index=False)
+    return path
+
+
+def percentile(times, q):
+    '''Returns a percentile of a list of durations in milliseconds.'''
+    return float(np.percentile(times, q)) * 1000
+
+
+def measure(func, make_args, iterations, to_json):
+    '''Measures the latency, allocations and payload size of a function.
+
+    Parameters
+    ----------
+    func : callable
+        The function to measure.
+    make_args : callable
+        Returns the arguments of one call.
+    iterations : int
+        The number of timed calls.
+    to_json : callable
+        Serializes a result like Dash does, to measure the payload size.
+
+    Returns
+    -------
+    dict
+        Return the measurements
+    '''
+    times = []
+    sizes = []
+    for _ in range(iterations):
+        args = make_args()
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+        sizes.append(len(to_json(result)))
+
+    # allocations are measured separately since tracing slows down the calls
+    peaks = []
+    for _ in range(min(iterations, 20)):
+        args = make_args()
+        tracemalloc.start()
+        func(*args)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return dict(p50_ms=percentile(times, 50),
+                p90_ms=percentile(times, 90),
+                p99_ms=percentile(times, 99),
+                mean_ms=float(np.mean(times)) * 1000,
+                peak_alloc_kb=float(np.mean(peaks)) / 1024,
+                payload_bytes=float(np.mean(sizes)))
+
+
+def callback_cases(dashboard, rng):
+    '''Returns the callbacks to benchmark with their argument generators.'''
+    from dashboard import (update_year_value, update_year_value_2,
+                           update_year_value_3)
+
+    def year():
+        return rng.choice(dashboard.years)
+
+    def click():
+        return {'points': [{'location': rng.choice(dashboard.gdp.codes)}]}
+
+    return [
+        ('get_map_figure', dashboard.get_map_figure,
+         lambda: (year(), rng.choice([0, 1]))),
+        ('get_map_figure (uncached)', dashboard._render_map_figure,
+         lambda: ('gdp', year(), rng.choice([0, 1]))),
+        ('update_histogram', dashboard.update_histogram,
+         lambda: (year(), year())),
+        ('update_graph', dashboard.update_graph, lambda: (click(),)),
+        ('update_year_value', update_year_value, lambda: (year(),)),
+        ('update_year_value_2', update_year_value_2, lambda: (year(),)),
+        ('update_year_value_3', update_year_value_3, lambda: (year(),)),
+    ]
+
+
+def endpoint_cases(dashboard, rng):
+    '''Returns the callback requests to benchmark through the endpoint.'''
+    def year():
+        return rng.choice(dashboard.years)
+
+    def slider(id):
+        return lambda: [dict(id=id, property='value', value=year())]
+
+    def click():
+        location = rng.choice(dashboard.gdp.codes)
+        return [dict(id='world-map', property='clickData',
+                     value={'points': [{'location': location}]})]
+
+    return [
+        ('world-map.figure', slider('year-slider')),
+        ('world-map-2.figure', slider('year-slider-2')),
+        ('world-map-3.figure', slider('year-slider-3')),
+        ('year-slider-value.children', slider('year-slider')),
+        ('year-slider-value-2.children', slider('year-slider-2')),
+        ('year-slider-value-3.children', slider('year-slider-3')),
+        ('histogram.figure',
+         lambda: slider('year-slider-2')() + slider('year-slider-3')()),
+        ('country-gdp-graph.figure', click),
+    ]
+
+
+def request_body(output, inputs):
+    '''Returns the body of a `_dash-update-component` request.'''
+    id, property = output.split('.')
+    return dict(output=output,
+                outputs=dict(id=id, property=property),
+                inputs=inputs,
+                changedPropIds=['{id}.{property}'.format(**inputs[0])])
+
+
+def run(config, iterations, seed):
+    '''Runs the benchmarks and returns the results keyed by case name.'''
+    from dashboard import Dashboard
+    from plotly.io.json import to_json_plotly
+
+    dashboard = Dashboard(config)
+    results = {}
+    rng = random.Random(seed)
+    for name, func, make_args in callback_cases(dashboard, rng):
+        results[name] = measure(func, make_args, iterations, to_json_plotly)
+
+    client = dashboard.server.test_client()
+
+    def post(output, inputs):
+        response = client.post('/_dash-update-component',
+                               json=request_body(output, inputs))
+        if response.status_code != 200:
+            raise RuntimeError('{} returned {}'.format(
+                output, response.status_code))
+        return response.data
+
+    rng = random.Random(seed)
+    for output, make_inputs in endpoint_cases(dashboard, rng):
+        results['endpoint ' + output] = measure(
+            post, lambda: (output, make_inputs()), iterations, bytes)
+    return results
+
+
+def print_results(results, baseline=None):
+    '''Prints the results, with the p50 ratio to a baseline if given.'''
+    header = '{:<42} {:>9} {:>9} {:>9} {:>11} {:>10}'.format(
+        'case', 'p50 ms', 'p90 ms', 'p99 ms', 'alloc KiB', 'bytes')
+    if baseline:
+        header += ' {:>9}'.format('p50 diff')
+    print(header)
+    for name, result in results.items():
+        line = '{:<42} {p50_ms:>9.3f} {p90_ms:>9.3f} {p99_ms:>9.3f} ' \
+               '{peak_alloc_kb:>11.1f} {payload_bytes:>10.0f}'.format(
+                   name, **result)
+        if baseline and name in baseline:
+            line += ' {:>+8.1f}%'.format(
+                (result['p50_ms'] / baseline[name]['p50_ms'] - 1) * 100)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='timed calls per case')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random inputs')
+    parser.add_argument('--synthetic', type=int, metavar='SCALE',
+                        help='use a synthetic csv with SCALE times the '
+                             'countries of GDP-clean.csv')
+    parser.add_argument('--output', help='write the results to a json file')
+    parser.add_argument('--compare', help='compare with a results json file')
+    args = parser.parse_args()
+
+    # the app is loaded from the repository root, with every callback served
+    # by the server so that all of them can be measured
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from dashboard import config_from_env
+    config = config_from_env()
+    config['clientside'] = False
+    if args.synthetic:
+        config['csv'] = make_synthetic_csv(args.synthetic)
+
+    results = run(config, args.iterations, args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(csv=config['csv'],
+                           iterations=args.iterations, seed=args.seed,
+                           results=results), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
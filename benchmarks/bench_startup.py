@@ -0,0 +1,150 @@
+'''Benchmarks the cold start of app.py.
+
+The app is imported in fresh Python processes, as a dyno boot or a worker
+recycle does, and the import time is reported with the slowest
+dependencies: the time spent importing the modules of every top-level
+package, e.g. `dash` or `numpy`, while the app is imported. The run fails
+when the median import time exceeds the budget, or when a module that
+should only be imported on first use is imported at startup.
+
+Some modules the app never uses are imported by Dash itself and cannot be
+deferred by the app: `dash.dcc.Graph` imports the figure classes of
+`plotly.graph_objs`, and `dash._jupyter` imports `IPython` whenever it is
+installed. IPython is not in requirements.txt, so it is not installed on
+the dynos. They are reported with their import time instead of failing the
+run.
+
+Usage
+-----
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --budget 1.2
+'''
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imports the app and prints its import time and the loaded modules; the
+# marker separates the imports of the app from those of the interpreter
+MARKER = 'import app'
+IMPORT_SCRIPT = '''
+import sys, json, time
+sys.stderr.write({marker!r} + '\\n')
+sys.stderr.flush()
+start = time.perf_counter()
+import app
+print(json.dumps(dict(seconds=time.perf_counter() - start,
+                      modules=sorted(sys.modules))))
+'''.format(marker=MARKER)
+
+# modules imported by Dash that the app cannot defer, with the reason
+DASH_IMPORTS = {
+    'plotly.graph_objs': 'imported by dash.dcc.Graph',
+    'IPython': 'imported by dash._jupyter when installed, not in '
+               'requirements.txt',
+}
+
+
+def parse_importtime(stderr):
+    '''Returns the import time of the dependencies imported by the app.
+
+    The time of a dependency is the sum of the own import times of its
+    modules, so that the time of a package is not counted again in the
+    packages importing it.
+
+    Parameters
+    ----------
+    stderr : str
+        The output of `python -X importtime` running IMPORT_SCRIPT.
+
+    Returns
+    -------
+    dict
+        Return the import time in seconds, keyed by top-level package
+    '''
+    times = {}
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER)+1:]
+    for line in lines:
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        times[package] = times.get(package, 0) + int(own) / 1e6
+    return times
+
+
+def import_app(importtime=False):
+    '''Imports the app in a fresh process and returns the measurements.
+
+    With `importtime`, the import time of the modules imported by the app
+    is measured as well, which slows down the import.
+    '''
+    options = ['-X', 'importtime'] if importtime else []
+    process = subprocess.run(
+        [sys.executable] + options + ['-c', IMPORT_SCRIPT],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    if importtime:
+        result['imported'] = parse_importtime(process.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5,
+                        help='number of timed imports')
+    parser.add_argument('--budget', type=float, default=1.5,
+                        help='maximum median import time in seconds')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of slowest imports to report')
+    parser.add_argument('--forbid', action='append',
+                        help='module that must not be imported at startup, '
+                             'may be repeated (default: pandas)')
+    args = parser.parse_args()
+    # a default list would be appended to instead of being replaced
+    if args.forbid is None:
+        args.forbid = ['pandas']
+
+    # the first import builds the data store and the figure cache if needed,
+    # which a deployed app has done before
+    profile = import_app(importtime=True)
+    runs = [import_app() for _ in range(args.runs)]
+
+    seconds = [run['seconds'] for run in runs]
+    median = float(np.median(seconds))
+    print('import app: median {:.3f}s, min {:.3f}s, max {:.3f}s '
+          '(budget {:.3f}s)'.format(median, min(seconds), max(seconds),
+                                    args.budget))
+
+    imported = profile['imported']
+    slowest = sorted(imported.items(), key=lambda item: -item[1])
+    print('{:<30} {:>9}'.format('dependency', 'ms'))
+    for name, seconds in slowest[:args.top]:
+        print('{:<30} {:>9.1f}'.format(name, seconds * 1000))
+
+    errors = []
+    if median > args.budget:
+        errors.append('the median import time {:.3f}s exceeds the budget '
+                      'of {:.3f}s'.format(median, args.budget))
+    loaded = set(runs[-1]['modules'])
+    for module in args.forbid:
+        if module in loaded:
+            errors.append('{} is imported at startup'.format(module))
+    for module, reason in sorted(DASH_IMPORTS.items()):
+        if module in loaded:
+            print('NOTE: {} is imported at startup: {}'.format(module,
+                                                               reason))
+    for error in errors:
+        print('FAIL: ' + error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
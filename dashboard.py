@@ -0,0 +1,1358 @@
+'''The Global Inequality Visualization dashboard and its app factory.
+
+`create_app(config)` builds a Dash app with its data source, figure cache,
+callback mode and asset serving set by the given configuration, so that
+several differently configured apps can run in the same process, e.g. to
+benchmark them or to build test clients. `app.py` and `my_app.py` are thin
+entry points around it.
+'''
+import os
+import time
+import functools
+import numpy as np
+import logging
+
+import dash
+from dash import Patch, dcc, html
+
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from flask import abort, request
+from plotly.offline import get_plotlyjs_version
+
+from dataapi import serve_data_api
+from datastore import STORE_DIR, IndicatorRegistry, as_list, as_typed_array
+from figurecache import FigureCache, figure_key
+from geometry import (GEOMETRY_PATH, LEVELS, RESOLUTIONS, WorldGeometry,
+                      topology_name)
+from inequality import inequality_statistics
+from metrics import CallbackMetrics, instrument
+from responses import cached_response, encodings, optimize_responses
+from singleflight import single_flight
+
+# turn off web logs
+logger = logging.getLogger('werkzeug')  # WSGI - web server gateway interface
+logger.setLevel(logging.ERROR)
+
+# configuration used by create_app for the keys that are not given
+DEFAULT_CONFIG = dict(
+    # csv of the GDP per capita of every country
+    csv='GDP-clean.csv',
+    # directory where the binary stores of the csv files are written
+    store_dir=STORE_DIR,
+    # persistent cache of the figures, shared by the workers of the host and
+    # kept across restarts where the disk is persistent (not on Heroku
+    # dynos, whose figures are built again when gunicorn starts, see
+    # gunicorn.conf.py); None disables it
+    figure_cache=os.path.join(STORE_DIR, 'figures.sqlite'),
+    figure_cache_mb=256,
+    # at most max_indicators indicator matrices stay loaded
+    max_indicators=8,
+    # in client-side mode the year labels and map year switching are done in
+    # the browser (assets/clientside.js) instead of through server callbacks
+    clientside=True,
+    # build the figures of GDP per capita when the app is created, within
+    # warm_seconds if it is not None; the figures left are built on first
+    # use (see gunicorn.conf.py)
+    warm=True,
+    warm_seconds=None,
+    # directory shared by the worker processes of the server, where they
+    # write their callback metrics so that /metrics serves their sum (see
+    # metrics.py); None reports the metrics of each process
+    metrics_dir=None,
+    # `production` turns off the Flask debug mode and the Dash dev tools
+    # (dev tools UI, props check, hot reload and unminified bundles), while
+    # `development` leaves them to `app.run(debug=True)`
+    mode='production',
+    # serve the Dash component bundles from the app instead of a CDN
+    serve_locally=True,
+    assets_folder='assets/',
+    # world topology of the maps, served by the app in several
+    # simplification levels instead of being fetched from the Plotly CDN
+    geometry=GEOMETRY_PATH,
+    # send the values of the figures as base64 float32 arrays instead of
+    # JSON lists; None uses them if the plotly.js served by Dash decodes them
+    typed_arrays=None,
+)
+
+# years shown in the app
+first_year = 1961
+
+insights_text = '''The histogram plot shows that in the 1900s, there are many
+        countries on both the lower and upper end of the GDP-per-capita
+        spectrum, which means that there is inequality. Fast forward to 2017,
+        most countries are in the middle of the spectrum. This is good news for
+        us because we are moving towards a fairer world.'''
+
+
+# title of the map figure, formatted with the indicator title and the year
+map_title = '{title} ({year})<br>Source:\
+                <a href="http://databank.worldbank.org/data/\
+                source/world-development-indicators#">\
+                Worldbank</a>'
+
+# colorscales used by get_map_figure, keyed by colorstyle
+colorscales = {
+    0: [[0, "rgb(103, 11, 99)"], [0.66, "rgb(91, 11, 239)"],
+        [0.78, "rgb(11, 55, 239)"], [0.86, "rgb(11, 95, 239)"],
+        [0.92, "rgb(232, 239, 11)"], [0.96, "rgb(239, 209, 11)"],
+        [0.99, "rgb(239, 103, 11)"], [1, "rgb(239, 11, 11)"]],
+    1: [[1-(1/10)*10**(1), "rgb(103, 11, 99)"],
+        [1-(1/10)*10**(4/5), "rgb(145,40,140)"],
+        [1-(1/10)*10**(3/5), "rgb(168,60,163)"],
+        [1-(1/10)*10**(2/5), "rgb(206,101,201)"],
+        [1-(1/10)*10**(1/5), "rgb(221,135,218)"],
+        [1, "rgb(232,185,230)"]],
+}
+
+# geometry level of the maps of every colorstyle; colorstyle 1 is only used
+# by the small side-by-side maps of Tab 2, which get a lighter topology
+map_geometry = {0: 'full', 1: 'coarse'}
+
+# how long in seconds the geometry is cached, whose URLs change with it
+geometry_max_age = 365 * 24 * 3600
+
+# display precision of the inequality measures
+inequality_decimals = 4
+
+# bins of the histogram in Tab 2
+histogram_bin_size = 0.085
+histogram_centers = [(i+0.5) * histogram_bin_size
+                     for i in range(int(np.ceil(1 / histogram_bin_size)))]
+
+
+def config_from_env(environ=None):
+    '''Returns the app configuration set by environment variables.
+
+    Parameters
+    ----------
+    environ : dict, optional
+        The environment variables. Defaults to `os.environ`.
+
+    Returns
+    -------
+    dict
+        Return the configuration, with the defaults of DEFAULT_CONFIG for
+        the variables that are not set
+    '''
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULT_CONFIG)
+    config['csv'] = environ.get('GDP_CSV', config['csv'])
+    # an empty GDP_FIGURE_CACHE disables the figure cache
+    config['figure_cache'] = environ.get('GDP_FIGURE_CACHE',
+                                         config['figure_cache']) or None
+    config['figure_cache_mb'] = int(environ.get(
+        'GDP_FIGURE_CACHE_MB', config['figure_cache_mb']))
+    config['max_indicators'] = int(environ.get(
+        'GDP_MAX_INDICATORS', config['max_indicators']))
+    config['clientside'] = environ.get('GDP_CLIENTSIDE', 'True') == 'True'
+    config['warm'] = environ.get('GDP_WARM_ON_IMPORT', 'True') == 'True'
+    if environ.get('GDP_WARM_SECONDS'):
+        config['warm_seconds'] = float(environ['GDP_WARM_SECONDS'])
+    config['metrics_dir'] = environ.get('GDP_METRICS_DIR') or None
+    config['mode'] = environ.get('GDP_MODE', config['mode'])
+    config['serve_locally'] = \
+        environ.get('GDP_SERVE_LOCALLY', 'True') == 'True'
+    config['geometry'] = environ.get('GDP_GEOMETRY', config['geometry'])
+    if 'GDP_TYPED_ARRAYS' in environ:
+        config['typed_arrays'] = environ['GDP_TYPED_ARRAYS'] == 'True'
+    return config
+
+
+def create_app(config=None):
+    '''Create the Dash app of the dashboard.
+
+    Parameters
+    ----------
+    config : dict, optional
+        The configuration of the app. Keys that are not given take their
+        value from DEFAULT_CONFIG.
+
+    Returns
+    -------
+    dash.Dash
+        Return the Dash app, whose Flask server is `app.server`
+    '''
+    return Dashboard(config).app
+
+
+def check_production(server):
+    '''Checks that a server runs without any debug tooling.
+
+    Called by gunicorn when it is ready to serve requests (see
+    gunicorn.conf.py), so that an app in debug mode is never served in
+    production.
+
+    Parameters
+    ----------
+    server : flask.Flask
+        The Flask server of the app.
+
+    Raises
+    ------
+    RuntimeError
+        If the Flask debug mode or any Dash dev tool is turned on, or if the
+        app is not in production mode
+    '''
+    problems = []
+    if server.debug:
+        problems.append('the Flask debug mode is on (FLASK_DEBUG?)')
+    dashboard = server.extensions.get('dashboard')
+    if dashboard is None:
+        problems.append('the server was not created by create_app')
+    else:
+        if dashboard.config['mode'] != 'production':
+            problems.append('the app is in {} mode (GDP_MODE)'.format(
+                dashboard.config['mode']))
+        dev_tools = dashboard.app._dev_tools
+        problems.extend('the Dash dev tool {} is on'.format(name)
+                        for name in ['ui', 'props_check', 'hot_reload',
+                                     'serve_dev_bundles', 'validate_callbacks']
+                        if dev_tools.get(name))
+    if problems:
+        raise RuntimeError('Refusing to serve the app with debug tooling: '
+                           + '; '.join(problems))
+
+
+def supports_typed_arrays():
+    '''Returns whether the plotly.js served by Dash decodes typed arrays.
+
+    Base64 typed arrays in figures are supported from plotly.js 2.28.
+    '''
+    version = get_plotlyjs_version().split('.')
+    return (int(version[0]), int(version[1])) >= (2, 28)
+
+
+def get_histogram_counts(values, bin_size):
+    '''Returns the histogram counts of every year.
+
+    The GDP per capita of every year is log-transformed and min-max scaled,
+    and the countries are then counted into bins of `bin_size` starting at
+    0, all in one vectorized pass over the matrix. Missing values are not
+    counted.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The year x country matrix of GDP per capita.
+    bin_size : float
+        The width of the bins.
+
+    Returns
+    -------
+    numpy.ndarray
+        Return the year x bin matrix of counts
+    '''
+    n_bins = int(np.ceil(1 / bin_size))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = np.log(values.astype(float))
+        low = np.fmin.reduce(scaled, axis=1)[:, None]
+        high = np.fmax.reduce(scaled, axis=1)[:, None]
+        scaled = (scaled-low) / (high-low)
+        valid = np.isfinite(scaled)
+        bins = np.minimum((scaled[valid] / bin_size).astype(int), n_bins-1)
+    rows = np.nonzero(valid)[0]
+    counts = np.bincount(rows*n_bins + bins, minlength=len(values)*n_bins)
+    return counts.reshape(len(values), n_bins)
+
+
+def update_year_value(year):
+    '''Update the year label for the slider in Tab 1.
+
+    A callback function that is triggered when the slider in Tab 1 is
+    used. The function uses the slider value to update the year label beside
+    the slider component.
+
+    Parameters
+    ----------
+    year : int
+        The value of the slider.
+
+    Returns
+    -------
+    str
+        Return the updated year
+    '''
+    return str(year)
+
+
+def update_year_value_2(year):
+    '''Update the year label for the first slider in Tab 2.
+
+    A callback function that is triggered when the first slider in Tab 2 is
+    used. The function uses the slider value to update the year label beside
+    the slider component.
+
+    Parameters
+    ----------
+    year : int
+        The value of the slider.
+
+    Returns
+    -------
+    str
+        Return the updated year
+    '''
+    return str(year)
+
+
+def update_year_value_3(year):
+    '''Update the year label for the second slider in Tab 2.
+
+    A callback function that is triggered when the second slider in Tab 2 is
+    used. The function uses the slider value to update the year label beside
+    the slider component.
+
+    Parameters
+    ----------
+    year : int
+        The value of the slider.
+
+    Returns
+    -------
+    str
+        Return the updated year
+    '''
+    return str(year)
+
+
+class Dashboard(object):
+    '''The dashboard, with its data, figures, layout and callbacks.
+
+    Every Dashboard has its own Dash app, indicators and figure caches, so
+    that several of them can live in the same process.
+
+    Parameters
+    ----------
+    config : dict, optional
+        The configuration of the app. Keys that are not given take their
+        value from DEFAULT_CONFIG.
+    '''
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.clientside_mode = self.config['clientside']
+
+        # adding __name__ fixes 'no css' issue
+        # the callbacks of Tab 2 refer to components that are only added to
+        # the layout when the tab is first opened
+        self.app = dash.Dash(__name__,
+                             assets_folder=self.config['assets_folder'],
+                             serve_locally=self.config['serve_locally'],
+                             suppress_callback_exceptions=True)
+        self.server = self.app.server
+        self.server.extensions['dashboard'] = self
+        if self.config['mode'] == 'production':
+            self.server.debug = False
+            self.app.enable_dev_tools(
+                debug=False, dev_tools_ui=False, dev_tools_props_check=False,
+                dev_tools_serve_dev_bundles=False, dev_tools_hot_reload=False,
+                dev_tools_validate_callbacks=False,
+                dev_tools_silence_routes_logging=True,
+                dev_tools_prune_errors=True)
+        # measure every server callback and serve the metrics at /metrics
+        self.callback_metrics = instrument(
+            self.app, CallbackMetrics(self.config['metrics_dir']))
+        # compress responses and add ETags to GET responses
+        optimize_responses(self.server)
+
+        # indicators served by the app, whose matrices are loaded on first
+        # use and (re)built from their csv if needed
+        self.indicators = IndicatorRegistry(
+            max_loaded=self.config['max_indicators'],
+            store_dir=self.config['store_dir'])
+        self.indicators.register('gdp', self.config['csv'],
+                                 title='GDP per capita', unit='USD',
+                                 prefix='$', decimals=2)
+        # read-only JSON and Arrow API of the indicator matrices, at /api
+        self.data_api = serve_data_api(self.server, self.indicators)
+        # the GDP matrix is loaded at startup
+        self.gdp = self.indicators.matrix('gdp')
+        self.figure_cache = FigureCache(
+            self.config['figure_cache'],
+            max_bytes=self.config['figure_cache_mb'] * 1024**2)
+        self.years = [year for year in self.gdp.data_years
+                      if year >= first_year]
+        self.geometry = WorldGeometry(self.config['geometry'])
+        self.typed_arrays = self.config['typed_arrays']
+        if self.typed_arrays is None:
+            self.typed_arrays = supports_typed_arrays()
+        # part of the cache keys of the figures, so that figures with values
+        # encoded otherwise are not served
+        self.array_format = 'f4' if self.typed_arrays else 'list'
+
+        # the figures are built once per app and cached; a burst of requests
+        # for a figure that is not cached yet builds it only once
+        max_indicators = self.config['max_indicators']
+        self._build_map_figure = functools.lru_cache(maxsize=1024)(
+            single_flight(self._build_map_figure))
+        self.get_map_figure_json = functools.lru_cache(maxsize=1024)(
+            single_flight(self.get_map_figure_json))
+        self.get_clientside_data = functools.lru_cache(maxsize=None)(
+            self.get_clientside_data)
+        self.get_histograms = functools.lru_cache(maxsize=max_indicators)(
+            single_flight(self.get_histograms))
+        self.get_trend_series = functools.lru_cache(maxsize=max_indicators)(
+            self.get_trend_series)
+        self.get_inequality_figure = functools.lru_cache(
+            maxsize=max_indicators)(self.get_inequality_figure)
+        self.get_geometry_json = functools.lru_cache(maxsize=len(LEVELS))(
+            single_flight(self.get_geometry_json))
+
+        # build the figures of GDP per capita at startup; warmed is None if
+        # they were not, or whether all of them were built in the budget
+        self.warmed = None
+        self.warm_time = 0.0
+        if self.config['warm']:
+            start = time.monotonic()
+            self.warmed = self.warm(self.config['warm_seconds'])
+            self.warm_time = time.monotonic() - start
+
+        # sets the title
+        self.app.title = 'Global Inequality Visualization'
+        self.app.layout = self.create_layout()
+        self.register_callbacks()
+        self.server.add_url_rule(
+            '/figures/map/<int:year>/<int:colorstyle>.json',
+            'map_figure_json', self.map_figure_json)
+        self.server.add_url_rule(
+            '/geometry/<version>/<level>/<name>.json',
+            'geometry_json', self.geometry_json)
+
+    def get_map_figure(self, year, colorstyle=0, indicator='gdp'):
+        '''Returns a map figure.
+
+        Generates a map figure of all countries with their GDP per capita
+        as a determinant of the colors that will be used to represent those
+        countries. The map is that of the year that was passed as first
+        parameter, and the colorstyle used is based on the integer vlaue
+        passed as second paramater
+
+        Figures are built once per (indicator, year, colorstyle) and cached,
+        so repeated slider moves return the stored figure instead of
+        rebuilding it. The returned figure is shared and must not be
+        modified by the caller. Years without data resolve to the nearest
+        year with data.
+
+        Parameters
+        ----------
+        year : int
+            The year of the map.
+        colorstyle : {0, 1}, optional
+            The color style to be used. 0 is the default value and it uses
+            the colors ranging from red to purple. The value 1 just uses
+            different hues of the color purple.
+        indicator : str, optional
+            The key of the indicator shown on the map. Defaults to GDP per
+            capita.
+
+        Returns
+        -------
+        dict
+            Return a map figure
+        '''
+        year = self.indicators.matrix(indicator).nearest_year(year)
+        return self._build_map_figure(indicator, year, int(colorstyle))
+
+    def _build_map_figure(self, indicator, year, colorstyle):
+        '''Returns the map figure returned by get_map_figure.
+
+        The figure is read from the persistent figure cache, or rendered and
+        stored in it.
+        '''
+        return self.figure_cache.fetch_figure(
+            self._map_figure_key(indicator, year, colorstyle),
+            lambda: self._render_map_figure(indicator, year, colorstyle))
+
+    def _map_figure_key(self, indicator, year, colorstyle):
+        '''Returns the key of a map figure in the persistent figure cache.'''
+        return figure_key('map', indicator,
+                          self.indicators.matrix(indicator).version,
+                          year, colorstyle, self.array_format)
+
+    def encode_values(self, values, decimals=None):
+        '''Returns the values of a figure trace as sent to the browser.
+
+        The values are rounded to their display precision and, if enabled,
+        encoded as a base64 float32 typed array instead of a list of
+        numbers. They are encoded once, when the figure is built, and the
+        cached figure is served as is afterwards.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            The values, with NaN for the missing ones.
+        decimals : int, optional
+            The display precision of the values.
+
+        Returns
+        -------
+        dict or list
+            Return the typed array, or the list of values
+        '''
+        if self.typed_arrays:
+            return as_typed_array(values, decimals)
+        return as_list(values, decimals)
+
+    def _render_map_figure(self, indicator, year, colorstyle):
+        '''Builds the map figure returned by get_map_figure.
+
+        Only the real countries are mapped, since the aggregates of the data,
+        e.g. regions and income groups, have no shape on the map. The values
+        are encoded by encode_values, so that the cached figure is ready to
+        be serialized without any further pandas or numpy conversion.
+        '''
+        matrix = self.indicators.matrix(indicator)
+        info = self.indicators.indicator(indicator)
+        data = [dict(
+            type='choropleth',
+            locations=matrix.country_codes,
+            z=self.encode_values(matrix.countries(year), info.decimals),
+            text=matrix.country_names,
+            colorscale=colorscales[colorstyle],
+            autocolorscale=False,
+            reversescale=True,
+            marker=dict(
+                line=dict(
+                    color='rgb(180,180,180)',
+                    width=0.9
+                )),
+            colorbar=dict(
+                autotick=False,
+                tickprefix=info.prefix,
+                lenmode='fraction',
+                len=0.8,
+                thicknessmode='pixels',
+                thickness=15,
+                xanchor='right',
+                y=0.5,
+                x=0,
+            ),
+
+        )]
+
+        layout = dict(
+            title=map_title.format(title=info.title, year=year),
+            geo=dict(
+                showframe=True,
+                showcoastlines=False,
+                projection=dict(
+                    type='Mercator'
+                ),
+                # the served topology has no ocean, which is the background
+                # of the map instead
+                bgcolor='#0eb3ef',
+                showland=True,
+                landcolor='white',
+                resolution=RESOLUTIONS[map_geometry[colorstyle]],
+            )
+        )
+
+        fig = dict(data=data, layout=layout)
+        return fig
+
+    def warm(self, seconds=None):
+        '''Builds the figures of GDP per capita.
+
+        Called once at startup so that no user request pays for building a
+        figure. Under `gunicorn --preload` the figures are built in the
+        master process while the app is imported, before the port is bound,
+        and inherited by the workers. The histograms, trend
+        series, inequality figure and map geometry are built first, then
+        the map figures of every year and colorstyle. Figures that are not
+        built within the time budget are built on first use.
+
+        Parameters
+        ----------
+        seconds : float, optional
+            The time budget of the warm-up. By default every figure is built.
+
+        Returns
+        -------
+        bool
+            Return whether every figure was built within the budget
+        '''
+        tasks = [(self.get_histograms, ('gdp',)),
+                 (self.get_trend_series, ('gdp',)),
+                 (self.get_inequality_figure, ())]
+        tasks += [(self.get_geometry_json, (level,))
+                  for level in sorted(set(map_geometry.values()))]
+        tasks += [(self.get_map_figure, (year, colorstyle))
+                  for year in self.years for colorstyle in colorscales]
+        start = time.monotonic()
+        for func, args in tasks:
+            if seconds is not None and time.monotonic() - start > seconds:
+                return False
+            func(*args)
+        return True
+
+    def get_map_update(self, year, colorstyle=0, indicator='gdp'):
+        '''Returns the update of a map figure for a year.
+
+        On the initial render of a map the full figure is returned. When the
+        year changes afterwards, only `z` and the title of the figure change,
+        so a Patch setting those two is returned instead of the whole figure.
+
+        Parameters
+        ----------
+        year : int
+            The year of the map.
+        colorstyle : {0, 1}, optional
+            The color style of the map.
+        indicator : str, optional
+            The key of the indicator shown on the map.
+
+        Returns
+        -------
+        dict or dash.Patch
+            Return the map figure, or the Patch updating the current one
+        '''
+        fig = self.get_map_figure(year, colorstyle, indicator)
+        if dash.ctx.triggered_id is None:
+            return fig
+        patch = Patch()
+        patch['data'][0]['z'] = fig['data'][0]['z']
+        patch['layout']['title'] = fig['layout']['title']
+        return patch
+
+    def get_map_figure_json(self, year, colorstyle, indicator='gdp'):
+        '''Returns a serialized map figure.
+
+        Parameters
+        ----------
+        year : int
+            The year of the map.
+        colorstyle : {0, 1}
+            The color style of the map.
+        indicator : str, optional
+            The key of the indicator shown on the map.
+
+        Returns
+        -------
+        tuple
+            Return the JSON of the figure and its compressed versions keyed
+            by encoding
+        '''
+        year = self.indicators.matrix(indicator).nearest_year(year)
+        data = self.figure_cache.fetch(
+            self._map_figure_key(indicator, year, colorstyle),
+            lambda: self.get_map_figure(year, colorstyle, indicator))
+        return data, encodings(data)
+
+    def map_figure_json(self, year, colorstyle):
+        '''Serves a map figure as a cacheable JSON document.
+
+        The indicator is chosen with the `indicator` query parameter and
+        defaults to GDP per capita. The response has an ETag built from the
+        indicator, its data version, the year and the colorstyle, so browsers
+        and reverse proxies can cache it and revalidate it cheaply. The ETag
+        is that of the figure in the figure cache. The route is an API for
+        other clients: the maps of the app switch years in the browser from
+        the data of `gdp-store` in client-side mode.
+        '''
+        indicator = request.args.get('indicator', 'gdp')
+        if indicator not in self.indicators or colorstyle not in colorscales:
+            abort(404)
+        matrix = self.indicators.matrix(indicator)
+        if year not in matrix.year_index:
+            abort(404)
+        data, encoded = self.get_map_figure_json(year, colorstyle, indicator)
+        etag = self._map_figure_key(indicator, year,
+                                    colorstyle).replace('/', '-')
+        return cached_response(data, etag, encoded)
+
+    def get_geometry_json(self, level):
+        '''Returns the serialized world topology of a simplification level.
+
+        Parameters
+        ----------
+        level : str
+            The simplification level, a key of geometry.LEVELS.
+
+        Returns
+        -------
+        tuple
+            Return the JSON of the topology and its compressed versions keyed
+            by encoding
+        '''
+        data = self.geometry.topology(level)
+        return data, encodings(data)
+
+    def geometry_json(self, version, level, name):
+        '''Serves the world topology of a simplification level.
+
+        The URL contains the version of the topology of the level, so the
+        response is cached by browsers and reverse proxies for a year
+        without revalidation. Plotly requests it from the `topojsonURL` set
+        by graph_config.
+        '''
+        if (level not in LEVELS or name != topology_name(level)
+                or version != self.geometry.version(level)):
+            abort(404)
+        data, encoded = self.get_geometry_json(level)
+        etag = 'geometry-{}-{}'.format(version, level)
+        return cached_response(data, etag, encoded,
+                               max_age=geometry_max_age, immutable=True)
+
+    def graph_config(self, level):
+        '''Returns the config of a map graph using a geometry level.
+
+        Parameters
+        ----------
+        level : str
+            The simplification level of the topology of the map.
+
+        Returns
+        -------
+        dict
+            Return the config of the dcc.Graph, which makes Plotly fetch the
+            topology from the app instead of its CDN
+        '''
+        return dict(topojsonURL=self.app.get_relative_path(
+            '/geometry/{}/{}/'.format(self.geometry.version(level), level)))
+
+    def get_clientside_data(self):
+        '''Returns the data used by the client-side map callbacks.
+
+        The data is sent to the browser once through the `gdp-store`
+        component. It contains one figure template per colorstyle, the GDP
+        per capita of every country for each year, and the map title, so
+        that the browser can switch the year of a map by swapping only `z`
+        and the title.
+
+        The data is built once, and must not be modified by the caller.
+
+        Returns
+        -------
+        dict
+            Return the figure templates, GDP values per year and map title
+        '''
+        templates = {}
+        for colorstyle in colorscales:
+            fig = self.get_map_figure(self.years[-1], colorstyle)
+            templates[str(colorstyle)] = dict(
+                data=[dict(fig['data'][0], z=[])],
+                layout=dict(fig['layout'], title=''))
+        # encoded as in the map figures, without building the figure of
+        # every year, which is left to warm or to the first request
+        decimals = self.indicators.indicator('gdp').decimals
+        z = {str(year): self.encode_values(self.gdp.countries(year), decimals)
+             for year in self.years}
+        title = map_title.format(
+            title=self.indicators.indicator('gdp').title, year='{}')
+        return dict(templates=templates, z=z, title=title)
+
+    def get_histograms(self, indicator):
+        '''Returns the histogram counts of every year of an indicator.
+
+        Only the real countries are counted, and the aggregates of the data
+        do not take part in the min-max scaling.
+
+        Parameters
+        ----------
+        indicator : str
+            The key of the indicator.
+
+        Returns
+        -------
+        dict
+            Return the list of counts per bin, keyed by year
+        '''
+        matrix = self.indicators.matrix(indicator)
+        counts = self.figure_cache.fetch_figure(
+            figure_key('histograms', indicator, matrix.version,
+                       histogram_bin_size),
+            lambda: get_histogram_counts(matrix.countries(),
+                                         histogram_bin_size).tolist())
+        return dict(zip(matrix.years, counts))
+
+    def get_trend_series(self, indicator):
+        '''Returns the trend series of every country of an indicator.
+
+        Parameters
+        ----------
+        indicator : str
+            The key of the indicator.
+
+        Returns
+        -------
+        tuple
+            Return the years shared by all series, and the series of every
+            country, encoded by encode_values, keyed by country code
+        '''
+        matrix = self.indicators.matrix(indicator)
+        decimals = self.indicators.indicator(indicator).decimals
+        first = matrix.year_index[matrix.nearest_year(first_year)]
+        series = self.figure_cache.fetch_figure(
+            figure_key('trends', indicator, matrix.version, first_year,
+                       self.array_format),
+            lambda: {code: self.encode_values(values, decimals)
+                     for code, values in
+                     zip(matrix.codes, matrix.values[first:].T)})
+        return [str(year) for year in matrix.years[first:]], series
+
+    def get_inequality_figure(self, indicator='gdp'):
+        '''Returns the figure of the inequality measures across years.
+
+        The Gini coefficient, Theil index and 90/10 ratio of the real
+        countries, without the aggregates of the data, are computed for every
+        year in one pass over the matrix of the indicator. If a `population`
+        indicator is registered, the population-weighted measures are shown
+        as well. The figure is built once per indicator.
+
+        Parameters
+        ----------
+        indicator : str, optional
+            The key of the indicator. Defaults to GDP per capita.
+
+        Returns
+        -------
+        dict
+            Return the inequality figure
+        '''
+        matrix = self.indicators.matrix(indicator)
+        first = matrix.year_index[matrix.nearest_year(first_year)]
+        x = [str(year) for year in matrix.years[first:]]
+        values = matrix.countries()
+        statistics = [('', inequality_statistics(values), 'solid')]
+        if 'population' in self.indicators:
+            weights = self.indicators.matrix('population').reindex(
+                matrix.country_codes, matrix.years)
+            statistics.append((' (population-weighted)',
+                               inequality_statistics(values, weights),
+                               'dash'))
+
+        data = []
+        for suffix, measures, dash_style in statistics:
+            for key, name, yaxis in [('gini', 'Gini coefficient', 'y'),
+                                     ('theil', 'Theil index', 'y'),
+                                     ('p90_p10', '90/10 ratio', 'y2')]:
+                data.append(dict(type='scatter',
+                                 mode='lines',
+                                 x=x,
+                                 y=self.encode_values(measures[key][first:],
+                                                      inequality_decimals),
+                                 name=name + suffix,
+                                 yaxis=yaxis,
+                                 line=dict(dash=dash_style)))
+
+        layout = dict(title='Cross-country inequality of {}'.format(
+                          self.indicators.indicator(indicator).title),
+                      xaxis={'title': 'year'},
+                      yaxis={'title': 'Gini coefficient / Theil index'},
+                      yaxis2={'title': '90/10 ratio', 'overlaying': 'y',
+                              'side': 'right'},
+                      legend={'orientation': 'h'}
+                      )
+        fig = dict(data=data, layout=layout)
+        return fig
+
+    def create_slider(self, id, value):
+        '''Create a slider component.
+
+        Creates a slider component with an id and initial value of the two
+        parameters passed to this function. The range and marks of the
+        slider are those of the years with data.
+
+        Parameters
+        ----------
+        id : int
+            The id of the slider component.
+        value : int
+            Accepts a value ranging from the first to the last year with
+            data. This is the initial value of the slider component.
+
+        Returns
+        -------
+        dcc.Slider
+            Return a slider component
+        '''
+        years = self.years
+        return dcc.Slider(
+            id=id,
+            min=years[0],
+            max=years[-1],
+            step=1,
+            value=value,
+            marks={str(year): year for year in range(years[0], years[-1]+1)
+                   if year % 10 == 0},
+            className='year-slider'
+        )
+
+    def create_tab_2(self):
+        '''Create the content of Tab 2.
+
+        The content is not part of the initial layout, and is rendered by the
+        render_tab_2 callback when Tab 2 is first opened, so that its maps
+        and histogram are only built for the visitors who open it.
+
+        Returns
+        -------
+        list
+            Return the components of Tab 2
+        '''
+        return [
+            html.Div([
+                # Histogram
+                html.Div([
+                    dcc.Graph(id="histogram")
+                ], className="col-left col-lg-8"),
+                html.Div(id="conclusion", className="col-right col-lg-4",
+                         children=insights_text)
+            ], className="row align-items-center tab-content \
+                            top insights"),
+            html.Div([
+                # Graph 1
+                html.Div([
+                    html.Div([
+                        html.Div(id="year-slider-label-2",
+                                 className="year-slider-label",
+                                 children="Year"),
+                        self.create_slider('year-slider-2', self.years[0]),
+                        html.Div(id="year-slider-value-2",
+                                 className="year-slider-value")
+                    ], className="row justify-content-md-center \
+                                    align-items-center"),
+                    dcc.Graph(id="world-map-2", className="map",
+                              config=self.graph_config(map_geometry[1]))
+                ], className="col-left col-lg-6"),
+                # Graph 2
+                html.Div([
+                    html.Div([
+                        html.Div(id="year-slider-label-3",
+                                 className="year-slider-label",
+                                 children="Year"),
+                        self.create_slider('year-slider-3', self.years[-1]),
+                        html.Div(id="year-slider-value-3",
+                                 className="year-slider-value")
+                    ], className="row justify-content-md-center \
+                                    align-items-center"),
+                    dcc.Graph(id="world-map-3", className="map",
+                              config=self.graph_config(map_geometry[1]))
+                ], className="col-right col-lg-6"),
+
+            ], className="row align-items-center tab-content")
+        ]
+
+    def create_tab_3(self):
+        '''Create the content of Tab 3.
+
+        The content is not part of the initial layout, and is rendered by the
+        render_tab_3 callback when Tab 3 is first opened, so that the
+        inequality figure is only sent to the visitors who open it.
+
+        Returns
+        -------
+        list
+            Return the components of Tab 3
+        '''
+        return [
+            html.Div([
+                dcc.Graph(id="inequality-graph",
+                          figure=self.get_inequality_figure())
+            ], className="tab-content top")
+        ]
+
+    def create_layout(self):
+        '''Create the layout of the app.
+
+        Returns
+        -------
+        html.Div
+            Return the root component of the layout
+        '''
+        return html.Div([
+            html.Div([
+                html.H1(id='header',
+                        children='Global Inequality Visualization'),
+                html.Div(id='sub-header',
+                         children='by Jude Michael Teves, \
+                             Master of Science in Data Science (2018)'),
+                html.Br(),
+                html.Div([
+                    html.Span(
+                        children='''The first of the Sustainable Development \
+                            Goals (SDG) for the year 2030 is '''),
+                    html.Strong(children='''No Poverty'''),
+                    html.Span(children='''. Currently, the international \
+                        poverty line threshold is '''),
+                    html.Strong(children='''US$1.9/day'''),
+                    html.Span(children='''. In the process of aiming to
+                        achieve SDG 1, the gap between the rich
+                        and the poor will gradually decrease, but with the
+                        recent adverse events all around the world such as
+                        terrorism and immigration ban, one might think that we
+                        are straying further from the goal. But is it really
+                        the case? One way of measuring this is by looking at a
+                        country's GDP per capita.
+
+                        Gross Domestic Product (GDP) measures the total output
+                        of a country in a year and is a great indicator of a
+                        country's performance, and GDP per capita is the GDP
+                        divided by the population of a country. We can think of
+                        the GDP per capita as an indicator of how well-off the
+                        citizens are in a country. A higher GDP per capita
+                        means a higher income and standard of living.'''),
+                ], id="intro"),
+            ], id='intro-section'),
+            html.Div([
+                dcc.Tabs(id="tabs", value="tab-1", children=[
+                    # Tab 1
+                    dcc.Tab([
+                        html.Div(id="graph-guide-text",
+                                 className="tab-content top",
+                                 children='''The graphs are interactive. You
+                                     can move the slider to show the GDP per
+                                     capita for a given year. You can also
+                                     click on a country to display the GDP per
+                                     capita trends.'''),
+                        html.Div([
+                            html.Div(id="year-slider-label",
+                                     className="year-slider-label",
+                                     children="Year"),
+                            self.create_slider('year-slider', self.years[-1]),
+                            html.Div(id="year-slider-value",
+                                     className="year-slider-value"),
+                            html.Button(id="play-button",
+                                        className="play-button",
+                                        children="Play", n_clicks=0),
+                            # playback at 10 frames per second
+                            dcc.Interval(id="play-interval", interval=100,
+                                         disabled=True),
+                            dcc.Store(id="play-state")
+                        ], className="row justify-content-md-center \
+                                        align-items-center"),
+                        html.Div([
+                            html.Div([
+                                html.Div([
+                                    dcc.Graph(
+                                        id="world-map", className="map",
+                                        config=self.graph_config(
+                                            map_geometry[0]))
+                                ]),
+                                html.Div(id='text-output')
+                            ], className="col-left col-lg-7"),
+                            html.Div([
+                                dcc.Graph(id='country-gdp-graph')
+                            ], className="col-right col-lg-5 v-center"),
+                        ], className="row align-items-center content-tab1")
+                    ], className="container-fluid", value="tab-1",
+                        label="GDP per capita trend"),
+                    # Tab 2, whose content is rendered when it is first opened
+                    dcc.Tab([
+                        html.Div(id="tab-2-content")
+                    ], className="container-fluid", value="tab-2",
+                        label="GDP per capita comparison across years"),
+                    # Tab 3, whose content is rendered when it is first opened
+                    dcc.Tab([
+                        html.Div(id="tab-3-content")
+                    ], className="container-fluid", value="tab-3",
+                        label="Inequality over time")
+                ], className="tabs-section")
+            ], className="main-content"),
+            dcc.Store(id='gdp-store',
+                      data=self.get_clientside_data()
+                      if self.clientside_mode else None),
+        ], className="main")
+
+    def load_map_frames(self, n_clicks):
+        '''Load the frames of the map playback in Tab 1.
+
+        A callback function that is triggered when the play button in Tab 1
+        is first clicked in server mode. It sends the data of every year in
+        one batch to the `gdp-store` component, from which the browser then
+        plays the frames without further requests to the server.
+
+        Parameters
+        ----------
+        n_clicks : int
+            The number of clicks of the play button.
+
+        Returns
+        -------
+        dict
+            Return the data used by the client-side map callbacks
+        '''
+        if n_clicks != 1:
+            return dash.no_update
+        return self.get_clientside_data()
+
+    def update_map_1(self, year):
+        '''Update the map in Tab 1 when slider in Tab 1 is used.
+
+        A callback function that is triggered when the slider in Tab 1 is
+        used. The function uses the slider value as input to the
+        get_map_update function and returns the generated map figure or
+        update to the map in Tab 1.
+
+        Parameters
+        ----------
+        year : int
+            The year of the map.
+
+        Returns
+        -------
+        dict or dash.Patch
+            Return a map figure, or the update of the current one
+        '''
+        return self.get_map_update(year)
+
+    def update_map_2(self, year):
+        '''Update the first map in Tab 2 when its slider is used.
+
+        A callback function that is triggered when the first slider in Tab 2
+        is used. The function uses the slider value as input to the
+        get_map_update function and returns the generated map figure or
+        update to the first map in Tab 2.
+
+        Parameters
+        ----------
+        year : int
+            The year of the map.
+
+        Returns
+        -------
+        dict or dash.Patch
+            Return a map figure, or the update of the current one
+        '''
+        return self.get_map_update(year, 1)
+
+    def update_map_3(self, year):
+        '''Update the second map in Tab 2 when its slider is used.
+
+        A callback function that is triggered when the second slider in Tab 2
+        is used. The function uses the slider value as input to the
+        get_map_update function and returns the generated map figure or
+        update to the second map in Tab 2.
+
+        Parameters
+        ----------
+        year : int
+            The year of the map.
+
+        Returns
+        -------
+        dict or dash.Patch
+            Return a map figure, or the update of the current one
+        '''
+        return self.get_map_update(year, 1)
+
+    def render_tab_2(self, tab, children):
+        '''Render the content of Tab 2 when it is first opened.
+
+        A callback function that is triggered when another tab is selected.
+        The content of Tab 2 is added to the layout the first time Tab 2 is
+        selected, which triggers the initial callbacks of its maps, year
+        labels and histogram, and is left as is afterwards.
+
+        Parameters
+        ----------
+        tab : str
+            The value of the selected tab.
+        children : list
+            The current content of Tab 2.
+
+        Returns
+        -------
+        list
+            Return the components of Tab 2
+        '''
+        if tab != 'tab-2' or children:
+            return dash.no_update
+        return self.create_tab_2()
+
+    def render_tab_3(self, tab, children):
+        '''Render the content of Tab 3 when it is first opened.
+
+        A callback function that is triggered when another tab is selected.
+        The content of Tab 3 is added to the layout the first time Tab 3 is
+        selected, and is left as is afterwards.
+
+        Parameters
+        ----------
+        tab : str
+            The value of the selected tab.
+        children : list
+            The current content of Tab 3.
+
+        Returns
+        -------
+        list
+            Return the components of Tab 3
+        '''
+        if tab != 'tab-3' or children:
+            return dash.no_update
+        return self.create_tab_3()
+
+    def update_histogram(self, year1, year2, indicator='gdp'):
+        '''Update the histogram in Tab 2.
+
+        A callback function that is triggered when any of the sliders in
+        Tab 2 is used. The function uses the sliders' values to generate an
+        overlapped histogram of the two years provided as input. The
+        histogram shows the distribution of countries with respect to the
+        min-max scaled log-transformed GDP per capita of the said countries
+        for the two years provided.
+
+        Parameters
+        ----------
+        year1 : int
+            The value of the first slider.
+        year2 : int
+            The value of the second slider.
+        indicator : str, optional
+            The key of the indicator shown in the histogram. Defaults to GDP
+            per capita.
+
+        Returns
+        -------
+        dict
+            Return the updated histogram figure
+        '''
+        histograms = self.get_histograms(indicator)
+        matrix = self.indicators.matrix(indicator)
+        year1 = matrix.nearest_year(year1)
+        year2 = matrix.nearest_year(year2)
+        title = self.indicators.indicator(indicator).title
+        trace1 = dict(
+            type='bar',
+            x=histogram_centers,
+            y=histograms[year1],
+            width=histogram_bin_size,
+            opacity=0.5,
+            name=str(year1)
+        )
+        trace2 = dict(
+            type='bar',
+            x=histogram_centers,
+            y=histograms[year2],
+            width=histogram_bin_size,
+            opacity=0.5,
+            name=str(year2)
+        )
+        data = [trace2, trace1]
+
+        layout = dict(title='{} histogram'.format(title),
+                      xaxis={'title': 'Min-Max-Scaled Log-Transformed '
+                                      '{}'.format(title)},
+                      yaxis={'title': 'Number of countries'},
+                      barmode='overlay'
+                      )
+        fig = dict(data=data, layout=layout)
+        return fig
+
+    def update_graph(self, clickData, indicator='gdp'):
+        '''Update the GDP per capita trend graph in Tab 1.
+
+        A callback function that is triggered when a country in the map in
+        Tab 1 is clicked. The country is retrieved from the clickData and is
+        then used to generate a line graph showing the trends in GDP per
+        capita of a country across all years.
+
+        Parameters
+        ----------
+        clickData : dict
+            The dictionary containing the details of the clicked point on the
+            map.
+        indicator : str, optional
+            The key of the indicator shown in the graph. Defaults to GDP per
+            capita.
+
+        Returns
+        -------
+        dict
+            Return the updated GDP per capita trend graph figure
+        '''
+        title = ''
+        data = []
+        if clickData and clickData.get('points'):
+            country = clickData['points'][0].get('location')
+        else:
+            country = 'PHL'
+        trend_years, trend_series = self.get_trend_series(indicator)
+        info = self.indicators.indicator(indicator)
+        if country in trend_series:
+            data = [{'x': trend_years,
+                     'y': trend_series[country],
+                     'type': 'line'}]
+            title = '{} {}'.format(
+                self.indicators.matrix(indicator).name(country), info.title)
+        else:
+            # e.g. a map region without a row in the data
+            title = 'No {} data for {}'.format(info.title, country)
+        layout = dict(title=title,
+                      xaxis={'title': 'year'},
+                      yaxis={'title': '{} ({})'.format(info.title, info.unit)}
+                      )
+        fig = dict(data=data, layout=layout)
+        return fig
+
+    def register_callbacks(self):
+        '''Registers the callbacks of the app.
+
+        In client-side mode the year labels and maps are updated by the
+        functions of assets/clientside.js, otherwise by the server.
+        '''
+        app = self.app
+        app.callback(Output('tab-2-content', 'children'),
+                     [Input('tabs', 'value')],
+                     [State('tab-2-content', 'children')],
+                     prevent_initial_call=True)(self.render_tab_2)
+        app.callback(Output('tab-3-content', 'children'),
+                     [Input('tabs', 'value')],
+                     [State('tab-3-content', 'children')],
+                     prevent_initial_call=True)(self.render_tab_3)
+        app.callback(Output('histogram', 'figure'),
+                     [Input('year-slider-2', 'value'),
+                      Input('year-slider-3', 'value')])(self.update_histogram)
+        app.callback(Output('country-gdp-graph', 'figure'),
+                     [Input('world-map', 'clickData')])(self.update_graph)
+
+        if self.clientside_mode:
+            for slider, label, graph, function in [
+                    ('year-slider', 'year-slider-value', 'world-map',
+                     'world_map'),
+                    ('year-slider-2', 'year-slider-value-2', 'world-map-2',
+                     'comparison_map'),
+                    ('year-slider-3', 'year-slider-value-3', 'world-map-3',
+                     'comparison_map')]:
+                app.clientside_callback(
+                    ClientsideFunction('gdp', 'year_label'),
+                    Output(label, 'children'), [Input(slider, 'value')])
+                app.clientside_callback(ClientsideFunction('gdp', function),
+                                        Output(graph, 'figure'),
+                                        [Input(slider, 'value'),
+                                         Input('gdp-store', 'data')])
+        else:
+            app.callback(Output('gdp-store', 'data'),
+                         [Input('play-button', 'n_clicks')],
+                         prevent_initial_call=True)(self.load_map_frames)
+            app.callback(Output('world-map', 'figure'),
+                         [Input('year-slider', 'value')])(self.update_map_1)
+            app.callback(Output('world-map-2', 'figure'),
+                         [Input('year-slider-2', 'value')])(self.update_map_2)
+            app.callback(Output('world-map-3', 'figure'),
+                         [Input('year-slider-3', 'value')])(self.update_map_3)
+            app.callback(Output('year-slider-value', 'children'),
+                         [Input('year-slider', 'value')])(update_year_value)
+            app.callback(Output('year-slider-value-2', 'children'),
+                         [Input('year-slider-2', 'value')])(
+                             update_year_value_2)
+            app.callback(Output('year-slider-value-3', 'children'),
+                         [Input('year-slider-3', 'value')])(
+                             update_year_value_3)
+
+        # the map playback in Tab 1 runs in the browser in both modes
+        app.clientside_callback(
+            ClientsideFunction('gdp', 'play'),
+            [Output('world-map', 'figure', allow_duplicate=True),
+             Output('year-slider-value', 'children', allow_duplicate=True),
+             Output('year-slider', 'value'),
+             Output('play-interval', 'disabled'),
+             Output('play-button', 'children'),
+             Output('play-state', 'data')],
+            [Input('play-button', 'n_clicks'),
+             Input('play-interval', 'n_intervals')],
+            [State('play-state', 'data'),
+             State('year-slider', 'value'),
+             State('gdp-store', 'data')],
+            prevent_initial_call=True)
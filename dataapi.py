@@ -0,0 +1,294 @@
+'''Read-only data API of the indicators served by the app.
+
+`serve_data_api` adds the following routes to the Flask server, which are
+served from the memory-mapped matrices of the indicators, without pandas:
+
+    /api/indicators                     the registered indicators
+    /api/<indicator>                    the version, years and countries
+    /api/<indicator>/years/<year>       the values of every country for a year
+    /api/<indicator>/countries/<code>   the values of a country for every year
+    /api/<indicator>/block              the values of a range of years for a
+                                        set of countries
+
+The values of a range of years are selected with the `start` and `end`
+query parameters (inclusive), and the countries with `countries`, a comma
+separated list of codes, or `kind` (`country`, `region` or `income`). The
+countries of the cross-sections and blocks are paginated with `offset` and
+`limit`, and the JSON response gives the offset of the next page.
+
+Responses are compact JSON, with missing values as null and values rounded
+to the display precision of the indicator, or Apache Arrow IPC streams with
+the float32 values of the matrix when `format=arrow` is given or the Arrow
+stream is the accepted mimetype. Arrow requires `pyarrow`, which is in
+requirements.txt; where it is not installed, Arrow requests are answered
+with `406 Not Acceptable`. Responses have an ETag built from the version of
+the data, the registered indicator and the request, so clients can
+revalidate them without the payload being built again.
+'''
+import json
+import hashlib
+
+import numpy as np
+from flask import abort, request
+
+from datastore import INCOME_GROUPS, KINDS, REGIONS, as_list
+from responses import cached_response
+
+# number of countries of a page, by default and at most
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# how long in seconds the responses may be cached without revalidation
+MAX_AGE = 3600
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+# the groups of countries selected by `kind`, part of the ETags since the
+# payloads change with them
+GROUPS = json.dumps([sorted(INCOME_GROUPS), sorted(REGIONS)])
+
+
+def _int_arg(name, default, minimum=0):
+    '''Returns an integer query parameter, aborting if it is invalid.'''
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        abort(400, '{} must be an integer'.format(name))
+    if value < minimum:
+        abort(400, '{} must be at least {}'.format(name, minimum))
+    return value
+
+
+def _wants_arrow():
+    '''Returns whether the client asked for an Arrow IPC stream.'''
+    data_format = request.args.get('format')
+    if data_format is None:
+        return (request.accept_mimetypes.best_match(
+            ['application/json', ARROW_MIMETYPE]) == ARROW_MIMETYPE)
+    if data_format not in ('json', 'arrow'):
+        abort(400, 'format must be json or arrow')
+    return data_format == 'arrow'
+
+
+def _values(values, decimals):
+    '''Returns a 1 or 2 dimensional array as JSON lists of values.'''
+    if decimals is None and values.ndim == 2:
+        return [as_list(row) for row in values]
+    return as_list(values, decimals)
+
+
+def _arrow_stream(columns):
+    '''Returns the Arrow IPC stream of a table of named columns.'''
+    try:
+        import pyarrow as pa
+    except ImportError:
+        abort(406, 'Arrow streams require pyarrow')
+    table = pa.table({name: pa.array(values, from_pandas=True)
+                      for name, values in columns})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class DataAPI(object):
+    '''The routes of the data API of an indicator registry.
+
+    Parameters
+    ----------
+    indicators : datastore.IndicatorRegistry
+        The indicators served by the API.
+    '''
+
+    def __init__(self, indicators):
+        self.indicators = indicators
+
+    def _matrix(self, indicator):
+        '''Returns the matrix of an indicator, aborting if it is unknown.'''
+        if indicator not in self.indicators:
+            abort(404)
+        return self.indicators.matrix(indicator)
+
+    def _year_rows(self, matrix):
+        '''Returns the rows of the years selected by `start` and `end`.'''
+        start = _int_arg('start', matrix.years[0])
+        end = _int_arg('end', matrix.years[-1])
+        return [i for i, year in enumerate(matrix.years)
+                if start <= year <= end]
+
+    def _columns(self, matrix):
+        '''Returns the columns of the countries selected by the request.
+
+        Returns
+        -------
+        tuple
+            Return the columns of the page, the number of selected countries
+            and the offset of the next page, or None on the last page
+        '''
+        codes = request.args.get('countries')
+        kind = request.args.get('kind')
+        if codes:
+            codes = codes.split(',')
+            unknown = [code for code in codes
+                       if code not in matrix.country_index]
+            if unknown:
+                abort(404, 'unknown countries: {}'.format(', '.join(unknown)))
+            columns = np.array([matrix.country_index[code] for code in codes],
+                               dtype=int)
+        elif kind is not None:
+            if kind not in KINDS:
+                abort(400, 'kind must be country, region or income')
+            columns = matrix.kind_columns[kind]
+        else:
+            columns = np.arange(len(matrix.codes))
+        offset = _int_arg('offset', 0)
+        limit = min(_int_arg('limit', PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+        next_offset = offset + limit if offset + limit < len(columns) else None
+        return columns[offset:offset+limit], len(columns), next_offset
+
+    def _respond(self, indicator, build_json, build_columns):
+        '''Returns the response of a request in JSON or as an Arrow stream.
+
+        The payload is only built if the client does not have it already.
+
+        Parameters
+        ----------
+        indicator : str
+            The key of the indicator of the payload.
+        build_json : callable
+            Returns the JSON payload.
+        build_columns : callable or None
+            Returns the named columns of the Arrow payload, or None if the
+            payload is only available in JSON.
+        '''
+        matrix = self._matrix(indicator)
+        arrow = build_columns is not None and _wants_arrow()
+        # the payload only depends on the data, the registered indicator,
+        # the groups of countries and the request
+        request_hash = hashlib.sha1('{} {} {!r} {}'.format(
+            request.full_path, arrow, self.indicators.indicator(indicator),
+            GROUPS).encode()).hexdigest()[:12]
+        etag = 'data-{}-{}-{}'.format(indicator, matrix.version, request_hash)
+        if request.if_none_match.contains_weak(etag):
+            # answered with `304 Not Modified` by cached_response
+            response = cached_response(b'', etag, max_age=MAX_AGE)
+        elif arrow:
+            response = cached_response(_arrow_stream(build_columns()), etag,
+                                       max_age=MAX_AGE,
+                                       mimetype=ARROW_MIMETYPE)
+        else:
+            data = json.dumps(build_json(), separators=(',', ':')).encode()
+            response = cached_response(data, etag, max_age=MAX_AGE)
+        if build_columns is not None:
+            response.vary.add('Accept')
+        return response
+
+    def indicators_json(self):
+        '''Serves the registered indicators.'''
+        data = json.dumps(
+            [dict(key=info.key, title=info.title, unit=info.unit)
+             for info in self.indicators.indicators.values()],
+            separators=(',', ':')).encode()
+        etag = 'data-indicators-{}'.format(
+            hashlib.sha1(data).hexdigest()[:12])
+        return cached_response(data, etag, max_age=60)
+
+    def indicator_json(self, indicator):
+        '''Serves the version, years and countries of an indicator.'''
+        matrix = self._matrix(indicator)
+        info = self.indicators.indicator(indicator)
+        return self._respond(indicator, lambda: dict(
+            key=indicator, title=info.title, unit=info.unit,
+            version=matrix.version, years=list(matrix.years),
+            data_years=matrix.data_years,
+            countries=[dict(code=code, name=name, kind=kind)
+                       for code, name, kind in
+                       zip(matrix.codes, matrix.names, matrix.kinds)]),
+            None)
+
+    def year_json(self, indicator, year):
+        '''Serves the values of the countries of an indicator for a year.'''
+        matrix = self._matrix(indicator)
+        if year not in matrix.year_index:
+            abort(404)
+        decimals = self.indicators.indicator(indicator).decimals
+        columns, total, next_offset = self._columns(matrix)
+        values = matrix.values[matrix.year_index[year], columns]
+        codes = [matrix.codes[i] for i in columns]
+        return self._respond(
+            indicator,
+            lambda: dict(indicator=indicator, version=matrix.version,
+                         year=year, codes=codes,
+                         values=_values(values, decimals), total=total,
+                         next_offset=next_offset),
+            lambda: [('code', codes), ('value', values)])
+
+    def country_json(self, indicator, code):
+        '''Serves the values of a country of an indicator for every year.'''
+        matrix = self._matrix(indicator)
+        if code not in matrix.country_index:
+            abort(404)
+        decimals = self.indicators.indicator(indicator).decimals
+        rows = self._year_rows(matrix)
+        years = [matrix.years[i] for i in rows]
+        values = matrix.country(code)[rows]
+        return self._respond(
+            indicator,
+            lambda: dict(indicator=indicator, version=matrix.version,
+                         code=code, name=matrix.name(code), years=years,
+                         values=_values(values, decimals)),
+            lambda: [('year', np.array(years, dtype=np.int16)),
+                     ('value', values)])
+
+    def block_json(self, indicator):
+        '''Serves the values of an indicator for years and countries.
+
+        The JSON values are one list per year, of the values of the
+        countries of the page. The Arrow table has a `year` column and one
+        column per country.
+        '''
+        matrix = self._matrix(indicator)
+        decimals = self.indicators.indicator(indicator).decimals
+        rows = self._year_rows(matrix)
+        columns, total, next_offset = self._columns(matrix)
+        years = [matrix.years[i] for i in rows]
+        codes = [matrix.codes[i] for i in columns]
+        values = matrix.values[np.ix_(rows, columns)]
+        return self._respond(
+            indicator,
+            lambda: dict(indicator=indicator, version=matrix.version,
+                         years=years, codes=codes,
+                         values=_values(values, decimals), total=total,
+                         next_offset=next_offset),
+            lambda: ([('year', np.array(years, dtype=np.int16))]
+                     + [(code, values[:, i]) for i, code in
+                        enumerate(codes)]))
+
+
+def serve_data_api(server, indicators):
+    '''Adds the routes of the data API to a Flask server.
+
+    Parameters
+    ----------
+    server : flask.Flask
+        The Flask server.
+    indicators : datastore.IndicatorRegistry
+        The indicators served by the API.
+
+    Returns
+    -------
+    DataAPI
+        Return the API serving the routes
+    '''
+    api = DataAPI(indicators)
+    server.add_url_rule('/api/indicators', 'data_indicators',
+                        api.indicators_json)
+    server.add_url_rule('/api/<indicator>', 'data_indicator',
+                        api.indicator_json)
+    server.add_url_rule('/api/<indicator>/years/<int:year>', 'data_year',
+                        api.year_json)
+    server.add_url_rule('/api/<indicator>/countries/<code>', 'data_country',
+                        api.country_json)
+    server.add_url_rule('/api/<indicator>/block', 'data_block',
+                        api.block_json)
+    return api
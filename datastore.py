@@ -0,0 +1,435 @@
+'''Columnar binary store of the World Bank CSV files.
+
+The CSV stays the source of truth. On first load it is converted into a
+float32 year x country matrix (`<name>.npy`) and an index of country codes,
+country names and years (`<name>.json`), which are then memory-mapped
+instead of parsing the CSV. The store is rebuilt automatically when the CSV
+changes.
+
+`IndicatorRegistry` keeps the indicators served by the app and loads their
+matrices on first use.
+'''
+import os
+import json
+import base64
+import hashlib
+import threading
+import collections
+
+import numpy as np
+
+from singleflight import SingleFlight
+
+# directory where the binary stores are written
+STORE_DIR = '.datastore'
+
+# World Bank income groups
+INCOME_GROUPS = frozenset([
+    'HIC', 'INX', 'LIC', 'LMC', 'LMY', 'MIC', 'UMC'])
+# kinds of the country codes, see classify
+KINDS = ('country', 'region', 'income')
+# World Bank regions and other groups of countries, e.g. lending groups and
+# small states
+REGIONS = frozenset([
+    'AFE', 'AFW', 'ARB', 'CEB', 'CSS', 'EAP', 'EAR', 'EAS', 'ECA', 'ECS',
+    'EMU', 'EUU', 'FCS', 'HPC', 'IBD', 'IBT', 'IDA', 'IDB', 'IDX', 'LAC',
+    'LCN', 'LDC', 'LTE', 'MEA', 'MNA', 'NAC', 'OED', 'OSS', 'PRE', 'PSS',
+    'PST', 'SAS', 'SSA', 'SSF', 'SST', 'TEA', 'TEC', 'TLA', 'TMN', 'TSA',
+    'TSS', 'WLD'])
+
+
+def _stamp(csv_path):
+    '''Returns the size and modification time of a CSV file.'''
+    stat = os.stat(csv_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _digest(csv_path):
+    '''Returns the SHA-1 digest of the content of a CSV file.'''
+    digest = hashlib.sha1()
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_index(index_path, index):
+    '''Writes the index of a store atomically.'''
+    tmp_path = index_path + '.{}.tmp'.format(os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+
+def _store_paths(csv_path, store_dir):
+    '''Returns the paths of the matrix and index files of a CSV file.
+
+    The names include a hash of the absolute path of the CSV file, so that
+    CSV files of the same name in different directories have their own
+    store.
+    '''
+    path_hash = hashlib.sha1(
+        os.path.abspath(csv_path).encode()).hexdigest()[:8]
+    name = '{}-{}'.format(
+        os.path.splitext(os.path.basename(csv_path))[0], path_hash)
+    return (os.path.join(store_dir, name + '.npy'),
+            os.path.join(store_dir, name + '.json'))
+
+
+def build_store(csv_path, store_dir=STORE_DIR):
+    '''Converts a CSV file into a binary store.
+
+    Reads a World Bank CSV file with `Country Name`, `Country Code` and one
+    column per year, and writes the year x country matrix and its index into
+    `store_dir`. The footer rows of the World Bank export, which have no
+    country code, are dropped. Files are written atomically so that workers
+    loading the store at the same time never see partial files.
+
+    Parameters
+    ----------
+    csv_path : str
+        The path of the CSV file.
+    store_dir : str, optional
+        The directory where the store is written.
+
+    Returns
+    -------
+    tuple of str
+        Return the paths of the matrix and index files
+    '''
+    # pandas is only needed to parse the CSV, so it is not imported when the
+    # store is up to date
+    import pandas as pd
+
+    matrix_path, index_path = _store_paths(csv_path, store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    stamp = _stamp(csv_path)
+
+    df = pd.read_csv(csv_path)
+    df = df.dropna(subset=['Country Code'])
+    year_columns = [column for column in df.columns if column.isdigit()]
+    values = df[year_columns].to_numpy(dtype=np.float32).T
+
+    index = dict(source=stamp,
+                 digest=_digest(csv_path),
+                 codes=df['Country Code'].tolist(),
+                 names=df['Country Name'].tolist(),
+                 years=[int(year) for year in year_columns])
+
+    tmp_suffix = '.{}.tmp'.format(os.getpid())
+    with open(matrix_path + tmp_suffix, 'wb') as f:
+        np.save(f, np.ascontiguousarray(values))
+    os.replace(matrix_path + tmp_suffix, matrix_path)
+    # the index is written last since it marks the store as up to date
+    _write_index(index_path, index)
+    return matrix_path, index_path
+
+
+def load_matrix(csv_path, store_dir=STORE_DIR):
+    '''Loads the binary store of a CSV file.
+
+    The store is (re)built first if it does not exist or if the CSV file
+    changed since it was built. The matrix is memory-mapped read-only, so its
+    pages are shared by every process that loads the same store.
+
+    The version of the matrix is the digest of the content of the CSV file,
+    so it only changes when the data does, and not when a deploy or checkout
+    only changes the modification time of the file.
+
+    Parameters
+    ----------
+    csv_path : str
+        The path of the CSV file.
+    store_dir : str, optional
+        The directory of the store.
+
+    Returns
+    -------
+    DataMatrix
+        Return the memory-mapped data matrix
+    '''
+    matrix_path, index_path = _store_paths(csv_path, store_dir)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = None
+    stamp = _stamp(csv_path)
+    if index is not None and 'digest' in index and index['source'] != stamp:
+        # the size or modification time changed, but maybe not the content
+        if index['digest'] == _digest(csv_path):
+            index['source'] = stamp
+            _write_index(index_path, index)
+    if index is None or 'digest' not in index or index['source'] != stamp:
+        build_store(csv_path, store_dir)
+        with open(index_path) as f:
+            index = json.load(f)
+
+    values = np.load(matrix_path, mmap_mode='r')
+    return DataMatrix(values, index['codes'], index['names'], index['years'],
+                      index['digest'][:12])
+
+
+def classify(code):
+    '''Returns the kind of a country code.
+
+    Parameters
+    ----------
+    code : str
+        The World Bank country code.
+
+    Returns
+    -------
+    str
+        Return `income` for income groups, `region` for regions and other
+        groups of countries, and `country` for every other code
+    '''
+    if code in INCOME_GROUPS:
+        return 'income'
+    if code in REGIONS:
+        return 'region'
+    return 'country'
+
+
+def as_list(values, decimals=None):
+    '''Converts a float32 array into a list that can be serialized to JSON.
+
+    Missing values become None, and values are written with the shortest
+    representation of their float32 value instead of the longer float64 one.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The float32 array to convert. Arrays of more than one dimension are
+        converted into nested lists if `decimals` is given.
+    decimals : int, optional
+        The number of decimals the values are rounded to, e.g. their display
+        precision. By default they are not rounded.
+
+    Returns
+    -------
+    list
+        Return the values as a list of floats and None
+    '''
+    if decimals is None:
+        return [None if np.isnan(v) else float(str(v)) for v in values]
+    values = np.round(np.asarray(values, dtype=np.float64), decimals)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def as_typed_array(values, decimals=None):
+    '''Converts an array into a base64 typed array of a Plotly figure.
+
+    plotly.js (from version 2.28) decodes `{'dtype': 'f4', 'bdata': ...}`
+    into a Float32Array, which is about a third of the size of the JSON
+    list of the same values and is not parsed number by number. Missing
+    values stay NaN, which Plotly does not draw, like None in a list.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The array to convert.
+    decimals : int, optional
+        The number of decimals the values are rounded to, e.g. their display
+        precision. By default they are not rounded.
+
+    Returns
+    -------
+    dict
+        Return the dtype and base64 encoded little-endian float32 values
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    if decimals is not None:
+        values = np.round(values, decimals)
+    data = values.astype('<f4').tobytes()
+    return dict(dtype='f4', bdata=base64.b64encode(data).decode('ascii'))
+
+
+class DataMatrix(object):
+    '''A year x country matrix with its country and year index.
+
+    The columns include the aggregates of the World Bank files, e.g. regions
+    and income groups. The columns of the real countries are indexed once
+    when the matrix is created, so that maps and statistics can leave the
+    aggregates out without filtering them on every request.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The float32 matrix with one row per year and one column per country.
+    codes : list of str
+        The country codes of the columns.
+    names : list of str
+        The country names of the columns.
+    years : list of int
+        The years of the rows.
+    version : str, optional
+        Identifies the source data of the matrix, and changes when it does.
+    '''
+
+    def __init__(self, values, codes, names, years, version=''):
+        self.values = values
+        self.codes = codes
+        self.names = names
+        self.years = years
+        self.version = version
+        self.year_index = {year: i for i, year in enumerate(years)}
+        self.country_index = {code: i for i, code in enumerate(codes)}
+        # kind of every column, and the columns of every kind, e.g. those of
+        # the real countries
+        self.kinds = [classify(code) for code in codes]
+        kinds = np.array(self.kinds)
+        self.kind_columns = {kind: np.flatnonzero(kinds == kind)
+                             for kind in KINDS}
+        self.country_columns = self.kind_columns['country']
+        self.country_codes = [codes[i] for i in self.country_columns]
+        self.country_names = [names[i] for i in self.country_columns]
+        # years with at least one value
+        self.data_years = [year for year, row in zip(years, values)
+                           if not np.isnan(row).all()] or list(years)
+
+    def year(self, year):
+        '''Returns the values of all countries for a year.'''
+        return self.values[self.year_index[int(year)]]
+
+    def nearest_year(self, year):
+        '''Returns the year with data nearest to a year.
+
+        Years outside the range of the data resolve to its first or last
+        year, and values that are not years resolve to its last year, so
+        that any slider value can be served without an exception.
+        '''
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            return self.data_years[-1]
+        if year in self.year_index and year in self.data_years:
+            return year
+        return min(self.data_years, key=lambda other: (abs(other-year), other))
+
+    def countries(self, year=None):
+        '''Returns the values of the real countries.
+
+        Parameters
+        ----------
+        year : int, optional
+            The year of the values. All years are returned if not given.
+
+        Returns
+        -------
+        numpy.ndarray
+            Return the values of the countries of `country_codes` for the
+            year, or the year x country matrix of them
+        '''
+        if year is None:
+            return self.values[:, self.country_columns]
+        return self.year(year)[self.country_columns]
+
+    def country(self, code):
+        '''Returns the values of a country for all years.'''
+        return self.values[:, self.country_index[code]]
+
+    def name(self, code):
+        '''Returns the name of a country.'''
+        return self.names[self.country_index[code]]
+
+    def reindex(self, codes, years):
+        '''Returns the values of the given countries and years.
+
+        Countries and years missing from the matrix get NaN values, so that
+        the result can be combined with the values of another matrix.
+
+        Parameters
+        ----------
+        codes : list of str
+            The country codes of the columns.
+        years : list of int
+            The years of the rows.
+
+        Returns
+        -------
+        numpy.ndarray
+            Return the year x country matrix of values
+        '''
+        rows = np.array([self.year_index.get(year, -1) for year in years])
+        columns = np.array([self.country_index.get(code, -1)
+                            for code in codes])
+        values = self.values[rows[:, None], columns[None, :]]
+        values[(rows < 0)[:, None] | (columns < 0)[None, :]] = np.nan
+        return values
+
+
+# an indicator served by the app, e.g. GDP per capita in USD with the `$`
+# prefix, whose values are sent to the browser rounded to `decimals`
+Indicator = collections.namedtuple(
+    'Indicator', ['key', 'csv_path', 'title', 'unit', 'prefix', 'decimals'])
+
+
+class IndicatorRegistry(object):
+    '''A registry of indicators whose matrices are loaded on first use.
+
+    At most `max_loaded` matrices are kept loaded, and the least recently
+    used one is dropped when another one is loaded, so memory stays bounded
+    however many indicators are registered.
+
+    Parameters
+    ----------
+    max_loaded : int, optional
+        The maximum number of loaded matrices.
+    store_dir : str, optional
+        The directory of the binary stores.
+    '''
+
+    def __init__(self, max_loaded=8, store_dir=STORE_DIR):
+        self.max_loaded = max_loaded
+        self.store_dir = store_dir
+        self.indicators = collections.OrderedDict()
+        self.loaded = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.loading = SingleFlight()
+
+    def __contains__(self, key):
+        return key in self.indicators
+
+    def register(self, key, csv_path, title, unit='', prefix='',
+                 decimals=None):
+        '''Registers an indicator.
+
+        Parameters
+        ----------
+        key : str
+            The key of the indicator, e.g. `gdp`.
+        csv_path : str
+            The path of the World Bank CSV file of the indicator.
+        title : str
+            The title of the indicator, e.g. `GDP per capita`.
+        unit : str, optional
+            The unit of the values, e.g. `USD`.
+        prefix : str, optional
+            The prefix of the values on the map colorbar, e.g. `$`.
+        decimals : int, optional
+            The display precision of the values, to which the figures round
+            them. By default they are not rounded.
+        '''
+        self.indicators[key] = Indicator(key, csv_path, title, unit, prefix,
+                                         decimals)
+
+    def indicator(self, key):
+        '''Returns the registered indicator of a key.'''
+        return self.indicators[key]
+
+    def matrix(self, key):
+        '''Returns the data matrix of an indicator, loading it if needed.'''
+        with self.lock:
+            if key in self.loaded:
+                self.loaded.move_to_end(key)
+                return self.loaded[key]
+        # concurrent first requests of an indicator load it only once
+        matrix = self.loading.do(key, load_matrix,
+                                 self.indicators[key].csv_path, self.store_dir)
+        with self.lock:
+            self.loaded[key] = matrix
+            self.loaded.move_to_end(key)
+            while len(self.loaded) > self.max_loaded:
+                self.loaded.popitem(last=False)
+        return matrix
@@ -0,0 +1,210 @@
+'''Persistent figure cache shared by the processes of a host.
+
+Serialized figures are stored in a SQLite database, so that every gunicorn
+worker on a host shares them, and they survive restarts on hosts with a
+persistent disk. On Heroku the filesystem of a dyno is ephemeral, so the
+cache starts empty on every dyno boot and is filled again by the warm-up
+(see warm_cache.py). Keys include the version of the data the figure was
+built from, so figures of a changed CSV are never served again and are
+evicted once the cache is full.
+
+Reads only write to the database when the access time of a figure is older
+than `ACCESS_RESOLUTION`, and the size of the cache is only summed every
+`SIZE_CHECK_INTERVAL` insertions of a process, so that the workers do not
+take the write lock of the database on every request.
+'''
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from plotly.io.json import to_json_plotly
+
+# default maximum size of the cache
+MAX_BYTES = 256 * 1024 * 1024
+# how old in seconds the recorded access time of a figure may be, which is
+# the precision of the least recently used order of the eviction
+ACCESS_RESOLUTION = 60
+# number of insertions of a process between two checks of the cache size
+SIZE_CHECK_INTERVAL = 32
+# version of the figures, changed whenever the way they are built changes so
+# that figures built by an older version of the app are not served
+FORMAT = 3
+
+
+def figure_key(figure_type, indicator, version, *params):
+    '''Returns the cache key of a figure.
+
+    Parameters
+    ----------
+    figure_type : str
+        The type of the figure, e.g. `map`.
+    indicator : str
+        The key of the indicator of the figure.
+    version : str
+        The version of the data of the indicator.
+    *params
+        The parameters of the figure, e.g. the year and colorstyle.
+
+    Returns
+    -------
+    str
+        Return the key of the figure
+    '''
+    return '/'.join(str(part) for part in
+                    (FORMAT, figure_type, indicator, version) + params)
+
+
+class FigureCache(object):
+    '''A size-bounded cache of serialized figures stored in SQLite.
+
+    When the cache grows beyond `max_bytes`, the least recently used entries
+    are deleted. Since the size is only checked every `size_check_interval`
+    insertions, the cache can exceed `max_bytes` by the figures inserted in
+    between. A cache without a path stores nothing.
+
+    Parameters
+    ----------
+    path : str or None
+        The path of the SQLite database.
+    max_bytes : int, optional
+        The maximum total size of the stored figures.
+    access_resolution : float, optional
+        How old in seconds the recorded access time of a figure may be.
+    size_check_interval : int, optional
+        The number of insertions between two checks of the cache size.
+    '''
+
+    def __init__(self, path, max_bytes=MAX_BYTES,
+                 access_resolution=ACCESS_RESOLUTION,
+                 size_check_interval=SIZE_CHECK_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_resolution = access_resolution
+        self.size_check_interval = size_check_interval
+        self.local = threading.local()
+        self.inserts = 0
+        self.inserts_lock = threading.Lock()
+
+    def _connection(self):
+        '''Returns the connection of the current thread and process.
+
+        Connections are never shared, including with the processes forked
+        after the cache was created.
+        '''
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None and self.local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10,
+                                     isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS figures ('
+                           'key TEXT PRIMARY KEY, value BLOB, size INTEGER, '
+                           'accessed REAL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS figures_accessed '
+                           'ON figures (accessed)')
+        self.local.connection = connection
+        self.local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        '''Returns the stored bytes of a key, or None if not stored.'''
+        if self.path is None:
+            return None
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT value, accessed FROM figures WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] >= self.access_resolution:
+            connection.execute('UPDATE figures SET accessed = ? WHERE key = ?',
+                               (now, key))
+        return row[0]
+
+    def set(self, key, value):
+        '''Stores the bytes of a key, evicting old entries if needed.'''
+        if self.path is None:
+            return
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?)',
+            (key, value, len(value), time.time()))
+        # the size is checked on the first insertion and every
+        # size_check_interval insertions after it
+        with self.inserts_lock:
+            self.inserts += 1
+            check = (self.inserts - 1) % self.size_check_interval == 0
+        if not check:
+            return
+        total = connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM figures').fetchone()[0]
+        if total > self.max_bytes:
+            self._evict(connection, total)
+
+    def _evict(self, connection, total):
+        '''Deletes the least recently used entries until the cache fits.'''
+        excess = total - self.max_bytes
+        keys = []
+        for key, size in connection.execute(
+                'SELECT key, size FROM figures ORDER BY accessed'):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany('DELETE FROM figures WHERE key = ?', keys)
+
+    def fetch(self, key, build):
+        '''Returns the serialized figure of a key, building it if needed.
+
+        The build may store the figure of the key itself, e.g. through
+        fetch_figure, in which case the stored bytes are returned instead of
+        serializing and storing the figure a second time.
+
+        Parameters
+        ----------
+        key : str
+            The key of the figure.
+        build : callable
+            Returns the figure, or any JSON serializable object.
+
+        Returns
+        -------
+        bytes
+            Return the JSON of the figure
+        '''
+        data = self.get(key)
+        if data is None:
+            figure = build()
+            data = self.get(key)
+            if data is None:
+                data = to_json_plotly(figure).encode()
+                self.set(key, data)
+        return data
+
+    def fetch_figure(self, key, build):
+        '''Returns the figure of a key, building it if needed.
+
+        Parameters
+        ----------
+        key : str
+            The key of the figure.
+        build : callable
+            Returns the figure, or any JSON serializable object.
+
+        Returns
+        -------
+        object
+            Return the figure
+        '''
+        data = self.get(key)
+        if data is None:
+            figure = build()
+            self.set(key, to_json_plotly(figure).encode())
+            return figure
+        return json.loads(data)
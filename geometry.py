@@ -0,0 +1,396 @@
+'''World geometry of the choropleth maps, served by the app itself.
+
+Plotly fetches the world topology of its maps from a CDN by default. The app
+serves it instead, from `geometry/world_110m.json`, so that maps render
+without any external request, and offers simplified versions of it so that
+small maps can use a lighter topology.
+
+The topology is built from the Natural Earth 110m countries (public domain)
+by running this module on their shapefile, which requires `pyshp`:
+
+    python geometry.py ne_110m_admin_0_countries.shp
+
+The countries are identified by their ISO 3 codes, as Plotly expects with
+`locationmode='ISO-3'`. Borders shared by two countries are stored once, as
+arcs of the topology, and simplification works on the arcs, so that the
+borders of simplified countries still match.
+'''
+import os
+import json
+import hashlib
+import functools
+
+import numpy as np
+
+# the source topology served to the maps
+GEOMETRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'geometry', 'world_110m.json')
+# simplification tolerance of every level, in degrees; 0 keeps every point
+LEVELS = {'full': 0, 'medium': 0.2, 'coarse': 0.5}
+# Plotly keeps one topology per file name, `world_<resolution>m.json`, for
+# the whole page, so maps of two levels on the same page set a different
+# `geo.resolution`; the resolution only names the file, every level is
+# built from the same 110m topology
+RESOLUTIONS = {'full': 110, 'medium': 50, 'coarse': 50}
+# number of distinct coordinates along each axis of the topology, and of
+# the simplified topologies, whose coarser grid makes their arcs shorter
+QUANTIZATION = 100000
+SIMPLIFIED_QUANTIZATION = 10000
+# codes of the Natural Earth countries without an ISO 3 code, by name
+MISSING_CODES = {'Kosovo': 'XKX'}
+
+
+def _signed_area(ring):
+    '''Returns the planar signed area of a ring, negative if clockwise.'''
+    x, y = np.asarray(ring, dtype=float).T
+    return (np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+
+
+def read_shapefile(path):
+    '''Reads the countries of a Natural Earth shapefile.
+
+    Parameters
+    ----------
+    path : str
+        The path of the shapefile.
+
+    Returns
+    -------
+    list of tuple
+        Return the code, name and polygons of every country. A polygon is a
+        list of rings, the exterior ring first, and a ring a list of
+        (longitude, latitude) points
+    '''
+    import shapefile
+
+    countries = []
+    reader = shapefile.Reader(path)
+    for record, shape in zip(reader.records(), reader.shapes()):
+        fields = {key.lower(): value
+                  for key, value in record.as_dict().items()}
+        name = fields.get('name', '')
+        code = fields.get('iso_a3', '-99')
+        if code == '-99':
+            code = fields.get('adm0_a3', code)
+        code = MISSING_CODES.get(name, code)
+        polygons = []
+        bounds = list(shape.parts) + [len(shape.points)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            ring = [tuple(point) for point in shape.points[start:end]]
+            # exterior rings are clockwise in shapefiles, and holes follow
+            # the exterior ring they belong to
+            if _signed_area(ring) <= 0 or not polygons:
+                polygons.append([ring])
+            else:
+                polygons[-1].append(ring)
+        countries.append((code if code != '-99' else None, name, polygons))
+    return countries
+
+
+def build_topology(countries, quantization=QUANTIZATION):
+    '''Builds the world topology of a list of countries.
+
+    The topology has the objects Plotly draws on a world map: `countries`
+    (with the ISO 3 codes as ids), `land` and `coastlines`, and empty
+    `ocean`, `lakes`, `rivers` and `subunits`. The maps of the app color the
+    ocean with the background of the map instead.
+
+    Parameters
+    ----------
+    countries : list of tuple
+        The code, name and polygons of every country, as returned by
+        read_shapefile. Countries without a code are only part of the land.
+    quantization : int, optional
+        The number of distinct coordinates along each axis.
+
+    Returns
+    -------
+    dict
+        Return the TopoJSON topology
+    '''
+    scale = [360 / (quantization-1), 180 / (quantization-1)]
+    translate = [-180, -90]
+
+    def quantize(ring):
+        points = []
+        for lon, lat in ring:
+            point = (int(round((lon-translate[0]) / scale[0])),
+                     int(round((lat-translate[1]) / scale[1])))
+            if not points or point != points[-1]:
+                points.append(point)
+        if points[0] != points[-1]:
+            points.append(points[0])
+        return points[:-1] if len(points) >= 4 else None
+
+    # the open rings of every polygon, quantized
+    geometries = []
+    for code, name, polygons in countries:
+        rings = [[quantize(ring) for ring in polygon] for polygon in polygons]
+        rings = [[ring for ring in polygon if ring] for polygon in rings
+                 if polygon[0]]
+        geometries.append((code, name, rings))
+
+    # points where rings meet or split up are the ends of the arcs
+    neighbors = {}
+    for _, _, polygons in geometries:
+        for polygon in polygons:
+            for ring in polygon:
+                for i, point in enumerate(ring):
+                    pair = tuple(sorted([ring[i-1], ring[(i+1) % len(ring)]]))
+                    neighbors.setdefault(point, set()).add(pair)
+    junctions = {point for point, pairs in neighbors.items()
+                 if len(pairs) > 1}
+
+    arcs = []
+    arc_index = {}
+    uses = []
+
+    def add_arc(points):
+        key = tuple(points)
+        if key in arc_index:
+            index = arc_index[key]
+        elif key[::-1] in arc_index:
+            index = ~arc_index[key[::-1]]
+        else:
+            index = arc_index[key] = len(arcs)
+            arcs.append(points)
+            uses.append(0)
+        uses[index if index >= 0 else ~index] += 1
+        return index
+
+    def cut(ring):
+        cuts = [i for i, point in enumerate(ring) if point in junctions]
+        if not cuts:
+            # rings without junctions start at their smallest point, so that
+            # the same ring of two countries gives the same arc
+            start = ring.index(min(ring))
+            ring = ring[start:] + ring[:start]
+            return [add_arc(ring + ring[:1])]
+        ring = ring[cuts[0]:] + ring[:cuts[0]]
+        ring = ring + ring[:1]
+        indexes = []
+        start = 0
+        for i in range(1, len(ring)):
+            if ring[i] in junctions or i == len(ring) - 1:
+                indexes.append(add_arc(ring[start:i+1]))
+                start = i
+        return indexes
+
+    country_geometries = []
+    land = []
+    for code, name, polygons in geometries:
+        if not polygons:
+            continue
+        shapes = [[cut(ring) for ring in polygon] for polygon in polygons]
+        if len(shapes) == 1:
+            geometry = dict(type='Polygon', arcs=shapes[0])
+        else:
+            geometry = dict(type='MultiPolygon', arcs=shapes)
+        land.append(dict(geometry))
+        if code:
+            geometry.update(id=code, properties=dict(name=name))
+            country_geometries.append(geometry)
+
+    # arcs of a single country are on the coast
+    coastlines = [[i] for i, count in enumerate(uses) if count == 1]
+
+    def empty():
+        return dict(type='GeometryCollection', geometries=[])
+
+    return dict(
+        type='Topology',
+        transform=dict(scale=scale, translate=translate),
+        objects=dict(
+            countries=dict(type='GeometryCollection',
+                           geometries=country_geometries),
+            land=dict(type='GeometryCollection', geometries=land),
+            coastlines=dict(type='MultiLineString', arcs=coastlines),
+            ocean=empty(), lakes=empty(), rivers=empty(), subunits=empty()),
+        arcs=[_delta_encode(arc) for arc in arcs])
+
+
+def _delta_encode(points):
+    '''Returns the delta encoding of the quantized points of an arc.'''
+    points = np.asarray(points, dtype=np.int64)
+    return np.vstack([points[:1], np.diff(points, axis=0)]).tolist()
+
+
+def _segment_distances(points, start, end):
+    '''Returns the distances of points to the segment from start to end.'''
+    segment = end - start
+    length = np.dot(segment, segment)
+    if length == 0:
+        return np.sqrt(((points-start)**2).sum(axis=1))
+    t = np.clip(np.dot(points-start, segment) / length, 0, 1)
+    projections = start + t[:, None]*segment
+    return np.sqrt(((points-projections)**2).sum(axis=1))
+
+
+def simplify_arc(points, tolerance):
+    '''Simplifies an arc with the Douglas-Peucker algorithm.
+
+    The ends of the arc are always kept, so that simplified arcs still meet
+    at the same points. Closed arcs keep at least four points, so that the
+    ring they form keeps an area.
+
+    Parameters
+    ----------
+    points : numpy.ndarray
+        The n x 2 array of the points of the arc.
+    tolerance : float
+        The maximum distance of a removed point to the simplified arc.
+
+    Returns
+    -------
+    numpy.ndarray
+        Return the points of the simplified arc
+    '''
+    n = len(points)
+    if n <= 2 or tolerance <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    closed = (points[0] == points[-1]).all()
+    if closed:
+        far = int(np.argmax(((points-points[0])**2).sum(axis=1)))
+        keep[far] = True
+        stack = [(0, far), (far, n-1)]
+    else:
+        stack = [(0, n-1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        distances = _segment_distances(points[i+1:j], points[i], points[j])
+        k = int(np.argmax(distances))
+        if distances[k] > tolerance:
+            keep[i+1+k] = True
+            stack.extend([(i, i+1+k), (i+1+k, j)])
+    if closed and keep.sum() < 4 and n >= 4:
+        distances = _segment_distances(points, points[0], points[far])
+        distances[keep] = -1
+        keep[int(np.argmax(distances))] = True
+    return points[keep]
+
+
+def simplify_topology(topology, tolerance,
+                      quantization=SIMPLIFIED_QUANTIZATION):
+    '''Simplifies every arc of a topology.
+
+    Parameters
+    ----------
+    topology : dict
+        The quantized TopoJSON topology.
+    tolerance : float
+        The tolerance in degrees.
+    quantization : int, optional
+        The number of distinct coordinates along each axis of the
+        simplified topology.
+
+    Returns
+    -------
+    dict
+        Return the simplified topology
+    '''
+    if tolerance <= 0:
+        return topology
+    transform = topology['transform']
+    scale = np.array(transform['scale'])
+    translate = np.array(transform['translate'])
+    new_scale = np.array([360, 180]) / (quantization-1)
+    arcs = []
+    for arc in topology['arcs']:
+        points = np.cumsum(np.asarray(arc, dtype=np.int64), axis=0)
+        # the tolerance is measured in degrees
+        simplified = simplify_arc(points*scale + translate, tolerance)
+        points = np.round((simplified-translate) / new_scale).astype(np.int64)
+        # points that fall on the same coordinates of the coarser grid
+        moves = np.any(np.diff(points, axis=0) != 0, axis=1)
+        points = points[np.concatenate([[True], moves])]
+        if len(points) == 1:
+            points = np.vstack([points, points])
+        arcs.append(_delta_encode(points))
+    return dict(topology, arcs=arcs,
+                transform=dict(scale=new_scale.tolist(),
+                               translate=translate.tolist()))
+
+
+def topology_name(level):
+    '''Returns the file name Plotly requests for the topology of a level.'''
+    return 'world_{}m'.format(RESOLUTIONS[level])
+
+
+class WorldGeometry(object):
+    '''The world topology and its simplification levels.
+
+    Parameters
+    ----------
+    path : str, optional
+        The path of the source topology.
+    '''
+
+    def __init__(self, path=GEOMETRY_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.source = f.read()
+
+    @functools.lru_cache(maxsize=len(LEVELS))
+    def topology(self, level):
+        '''Returns the serialized topology of a simplification level.
+
+        Parameters
+        ----------
+        level : str
+            The simplification level, a key of LEVELS.
+
+        Returns
+        -------
+        bytes
+            Return the JSON of the topology
+        '''
+        if LEVELS[level] == 0:
+            return self.source
+        topology = simplify_topology(json.loads(self.source), LEVELS[level])
+        return json.dumps(topology, separators=(',', ':')).encode()
+
+    @functools.lru_cache(maxsize=len(LEVELS))
+    def version(self, level):
+        '''Returns the version of the topology of a simplification level.
+
+        The version is a hash of the served topology, so it changes with the
+        source topology as well as with the tolerance of the level and the
+        simplification, and the URLs of a level can be cached forever.
+
+        Parameters
+        ----------
+        level : str
+            The simplification level, a key of LEVELS.
+
+        Returns
+        -------
+        str
+            Return the version of the topology
+        '''
+        return hashlib.sha1(self.topology(level)).hexdigest()[:12]
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Builds {} from the Natural '
+                                     'Earth countries'.format(GEOMETRY_PATH))
+    parser.add_argument('shapefile', help='the countries shapefile')
+    parser.add_argument('--output', default=GEOMETRY_PATH,
+                        help='the path of the topology')
+    args = parser.parse_args()
+
+    topology = build_topology(read_shapefile(args.shapefile))
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(topology, f, separators=(',', ':'))
+    print('Wrote {} countries and {} arcs to {}'.format(
+        len(topology['objects']['countries']['geometries']),
+        len(topology['arcs']), args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# gunicorn settings used by the Procfile
+import gc
+import os
+import tempfile
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', '8000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+# threaded workers, so that concurrent requests for the same figure in a
+# worker wait for a single computation of it (see singleflight.py) instead of
+# queueing behind each other
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# import the app once in the master process so that the memory-mapped GDP
+# matrix (see datastore.py) and the prebuilt figures are loaded before the
+# workers are forked, and shared by all of them instead of being loaded again
+# in every worker
+preload_app = True
+
+# the workers write their callback metrics into a directory of the master,
+# so that /metrics serves the sum of the metrics of every worker whichever
+# worker a scrape reaches (see metrics.py)
+if 'GDP_METRICS_DIR' not in os.environ:
+    os.environ['GDP_METRICS_DIR'] = tempfile.mkdtemp(prefix='gdp-metrics-')
+
+# the figures are built in the master while the app is preloaded, i.e.
+# before the port is bound and the workers are forked, so that no connection
+# is accepted before a worker can serve it and the workers inherit the
+# figures. Heroku fails a dyno that does not bind its port within 60 seconds
+# of starting, so the warm-up stops after GDP_WARM_SECONDS, leaving room for
+# importing the app; the figures left are built on first use
+os.environ.setdefault('GDP_WARM_SECONDS', '20')
+
+
+def when_ready(server):
+    # fail loudly instead of serving the app with debug tooling turned on
+    from dashboard import check_production
+    app_server = server.app.wsgi()
+    check_production(app_server)
+
+    dashboard = app_server.extensions['dashboard']
+    if dashboard.warmed is not None:
+        server.log.info('Built the figures in %.1fs%s', dashboard.warm_time,
+                        '' if dashboard.warmed else
+                        ' (time budget reached, the others are built on '
+                        'first use)')
+
+    # move the objects created while loading the app out of the garbage
+    # collector's reach, so that collections in the workers do not touch
+    # (and copy) the memory pages shared with the master
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
@@ -0,0 +1,142 @@
+'''Cross-country inequality measures of a year x country matrix.
+
+Every measure is computed for all years at once, in vectorized passes over
+the matrix. Missing values are ignored, and optional weights (e.g. the
+population of every country) give the population-weighted variants.
+'''
+import numpy as np
+
+
+def _prepare(values, weights):
+    '''Returns the values and weights of every year sorted by value.
+
+    Missing values, and values without a weight, get a value and weight of 0
+    and are sorted last, so that they do not contribute to any sum.
+    '''
+    values = np.asarray(values, dtype=float)
+    if weights is None:
+        weights = np.ones_like(values)
+    weights = np.asarray(weights, dtype=float)
+    valid = ~np.isnan(values) & ~np.isnan(weights) & (values > 0)
+    order = np.argsort(np.where(valid, values, np.inf), axis=1)
+    values = np.take_along_axis(np.where(valid, values, 0), order, axis=1)
+    weights = np.take_along_axis(np.where(valid, weights, 0), order, axis=1)
+    return values, weights, valid.sum(axis=1)
+
+
+def gini(values, weights=None):
+    '''Returns the Gini coefficient of every year.
+
+    The coefficient is computed from the Lorenz curve, as one minus twice
+    the area under it, which for equal weights equals the usual Gini
+    coefficient of the values.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The year x country matrix of values.
+    weights : numpy.ndarray, optional
+        The year x country matrix of weights, e.g. population.
+
+    Returns
+    -------
+    numpy.ndarray
+        Return the Gini coefficient of every year, NaN for years with less
+        than two values
+    '''
+    values, weights, count = _prepare(values, weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        income = np.cumsum(weights*values, axis=1)
+        income /= income[:, -1:]
+        # trapezoids between consecutive points of the Lorenz curve
+        previous = np.hstack([np.zeros((len(income), 1)), income[:, :-1]])
+        area = np.sum(weights / weights.sum(axis=1, keepdims=True)
+                      * (income+previous), axis=1) / 2
+        result = 1 - 2*area
+    result[count < 2] = np.nan
+    return result
+
+
+def theil(values, weights=None):
+    '''Returns the Theil T index of every year.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The year x country matrix of values.
+    weights : numpy.ndarray, optional
+        The year x country matrix of weights, e.g. population.
+
+    Returns
+    -------
+    numpy.ndarray
+        Return the Theil index of every year, NaN for years with less than
+        two values
+    '''
+    values, weights, count = _prepare(values, weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (np.sum(weights*values, axis=1, keepdims=True)
+                / np.sum(weights, axis=1, keepdims=True))
+        shares = weights*values / np.sum(weights*values, axis=1,
+                                          keepdims=True)
+        terms = np.where(weights > 0, shares * np.log(values/mean), 0)
+        result = np.sum(terms, axis=1)
+    result[count < 2] = np.nan
+    return result
+
+
+def percentile_ratio(values, weights=None, high=90, low=10):
+    '''Returns the ratio of two percentiles of every year, e.g. 90/10.
+
+    The percentiles are those of the (weighted) distribution of the values,
+    i.e. the smallest value below which at least the given share of the
+    total weight lies.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The year x country matrix of values.
+    weights : numpy.ndarray, optional
+        The year x country matrix of weights, e.g. population.
+    high : float, optional
+        The percentile of the numerator.
+    low : float, optional
+        The percentile of the denominator.
+
+    Returns
+    -------
+    numpy.ndarray
+        Return the percentile ratio of every year, NaN for years with less
+        than two values
+    '''
+    values, weights, count = _prepare(values, weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.cumsum(weights, axis=1) / weights.sum(axis=1,
+                                                          keepdims=True)
+        rows = np.arange(len(values))
+        upper = values[rows, np.argmax(shares >= high/100, axis=1)]
+        lower = values[rows, np.argmax(shares >= low/100, axis=1)]
+        result = upper / lower
+    result[count < 2] = np.nan
+    return result
+
+
+def inequality_statistics(values, weights=None):
+    '''Returns the inequality measures of every year.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The year x country matrix of values.
+    weights : numpy.ndarray, optional
+        The year x country matrix of weights, e.g. population.
+
+    Returns
+    -------
+    dict
+        Return the Gini coefficient, Theil index and 90/10 ratio of every
+        year, keyed by `gini`, `theil` and `p90_p10`
+    '''
+    return dict(gini=gini(values, weights),
+                theil=theil(values, weights),
+                p90_p10=percentile_ratio(values, weights))
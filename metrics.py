@@ -0,0 +1,368 @@
+'''Latency and payload-size metrics of the Dash callbacks.
+
+`instrument` wraps every server callback registered on a Dash app and serves
+the collected metrics at `/metrics` in the Prometheus text format.
+
+Metrics are collected per process. Behind a server with several worker
+processes, e.g. gunicorn, a scrape reaches an arbitrary worker, so the
+workers share a directory (`GDP_METRICS_DIR`, see gunicorn.conf.py) where
+a thread of each one writes a snapshot of its metrics every FLUSH_INTERVAL
+seconds, and `/metrics` serves the sum of the snapshots of every process,
+whichever process serves it. The snapshots only grow and those of exited
+workers are kept, so the counters never go down while the server runs,
+and lag the calls by at most FLUSH_INTERVAL seconds. Without a directory,
+every process reports its own metrics.
+'''
+import os
+import json
+import time
+import uuid
+import threading
+import functools
+
+from flask import Response
+from dash.exceptions import PreventUpdate
+
+# upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5)
+SIZE_BUCKETS = (100, 1000, 10000, 50000, 100000, 250000, 500000, 1000000)
+
+# maximum number of distinct values counted per callback input, so that the
+# number of series stays bounded
+MAX_INPUT_VALUES = 200
+
+# seconds between two snapshots of the metrics of a process in the shared
+# directory, i.e. how stale the served metrics may be
+FLUSH_INTERVAL = 5
+
+# metrics kept as histograms, with the attribute of CallbackMetrics keeping
+# them and their buckets
+HISTOGRAMS = [
+    ('dash_callback_latency_seconds', 'latency', LATENCY_BUCKETS),
+    ('dash_callback_serialization_seconds', 'serialization', LATENCY_BUCKETS),
+    ('dash_callback_response_bytes', 'response_bytes', SIZE_BUCKETS)]
+
+
+class Histogram(object):
+    '''A cumulative histogram with fixed buckets.'''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets)+1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        '''Adds a value to the histogram.'''
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, counts, total, count):
+        '''Adds the counts of a histogram with the same buckets.'''
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+    def lines(self, name, labels):
+        '''Returns the lines of the histogram in the Prometheus format.'''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                name, labels, bound, cumulative))
+        lines.append('{}_sum{{{}}} {}'.format(name, labels, self.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, self.count))
+        return lines
+
+
+class CallbackMetrics(object):
+    '''Collects the metrics of the callbacks of a Dash app.
+
+    For every callback, the number of calls and errors, the latency of the
+    callback function, the time Dash spends serializing its response, the
+    size of the response, and how often each input value is requested are
+    recorded.
+
+    Parameters
+    ----------
+    directory : str, optional
+        The directory shared by the processes of the server, where the
+        metrics of every process are written and read back to be summed.
+        By default every process reports its own metrics.
+    flush_interval : float, optional
+        The seconds between two snapshots of the metrics in `directory`.
+    '''
+
+    def __init__(self, directory=None, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.pid = None
+        self.reset()
+
+    def reset(self):
+        '''Clears the metrics, e.g. those inherited from a parent process.'''
+        self.calls = {}
+        self.errors = {}
+        self.latency = {}
+        self.serialization = {}
+        self.response_bytes = {}
+        self.input_values = {}
+        self.changed = False
+        self.path = None
+
+    def _check_process(self):
+        '''Starts the metrics of a forked process from zero.
+
+        A forked worker inherits the metrics of its parent, which are
+        already counted in the snapshot of the parent. Must be called with
+        the lock held.
+        '''
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.reset()
+            if self.directory is not None:
+                # pids are reused, the snapshot of a process is never
+                # overwritten by another one
+                self.path = os.path.join(
+                    self.directory,
+                    'callbacks-{}-{}.json'.format(self.pid, uuid.uuid4().hex))
+                # threads do not survive a fork, every process starts its own
+                flusher = threading.Thread(target=self._flush_periodically,
+                                           daemon=True)
+                flusher.start()
+
+    def _flush_periodically(self):
+        '''Writes the snapshot of the metrics every flush_interval.'''
+        pid = os.getpid()
+        while self.pid == pid:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def timed(self, func):
+        '''Wraps a callback function to measure its latency.'''
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.local.duration = time.perf_counter() - start
+        return wrapper
+
+    def measured(self, name, inputs, dash_callback):
+        '''Wraps the Dash callback calling a timed callback function.
+
+        The Dash callback calls the callback function and serializes its
+        output, so the serialization time is the time spent outside the
+        callback function.
+        '''
+        @functools.wraps(dash_callback)
+        def wrapper(*args, **kwargs):
+            self.local.duration = 0
+            start = time.perf_counter()
+            try:
+                response = dash_callback(*args, **kwargs)
+            except PreventUpdate:
+                raise
+            except Exception:
+                self.record_error(name)
+                raise
+            total = time.perf_counter() - start
+            self.record(name, self.local.duration, total-self.local.duration,
+                        len(response or ''), zip(inputs, args))
+            return response
+        return wrapper
+
+    def _count_input(self, name, input, value, count=1):
+        '''Counts the requests of an input value. The lock must be held.'''
+        counts = self.input_values.setdefault((name, input), {})
+        if value in counts or len(counts) < MAX_INPUT_VALUES:
+            counts[value] = counts.get(value, 0) + count
+
+    def _histograms(self, name):
+        '''Creates the histograms of a callback. The lock must be held.'''
+        if name not in self.calls:
+            self.calls[name] = 0
+            for _, attribute, buckets in HISTOGRAMS:
+                getattr(self, attribute)[name] = Histogram(buckets)
+
+    def record(self, name, latency, serialization, size, input_values):
+        '''Records a call of a callback.'''
+        with self.lock:
+            self._check_process()
+            self._histograms(name)
+            self.calls[name] += 1
+            self.latency[name].observe(latency)
+            self.serialization[name].observe(serialization)
+            self.response_bytes[name].observe(size)
+            for input, value in input_values:
+                if isinstance(value, (int, float, str)):
+                    self._count_input(name, input, value)
+            self.changed = True
+
+    def record_error(self, name):
+        '''Records a call of a callback that raised an exception.'''
+        with self.lock:
+            self._check_process()
+            self.errors[name] = self.errors.get(name, 0) + 1
+            self.changed = True
+
+    def snapshot(self):
+        '''Returns the metrics of the process as a JSON serializable dict.'''
+        with self.lock:
+            self._check_process()
+            return dict(
+                calls=self.calls.copy(), errors=self.errors.copy(),
+                histograms={attribute: {
+                    name: [histogram.counts, histogram.sum, histogram.count]
+                    for name, histogram in getattr(self, attribute).items()}
+                    for _, attribute, _ in HISTOGRAMS},
+                inputs=[[name, input, value, count]
+                        for (name, input), counts in self.input_values.items()
+                        for value, count in counts.items()])
+
+    def merge(self, snapshot):
+        '''Adds the metrics of a snapshot, e.g. of another process.'''
+        with self.lock:
+            for name, count in snapshot['calls'].items():
+                self._histograms(name)
+                self.calls[name] += count
+            for name, count in snapshot['errors'].items():
+                self.errors[name] = self.errors.get(name, 0) + count
+            for _, attribute, buckets in HISTOGRAMS:
+                histograms = getattr(self, attribute)
+                for name, state in snapshot['histograms'][attribute].items():
+                    histograms.setdefault(name, Histogram(buckets)).merge(
+                        *state)
+            for name, input, value, count in snapshot['inputs']:
+                self._count_input(name, input, value, count)
+
+    def flush(self):
+        '''Writes the snapshot of the metrics into the shared directory.
+
+        Called every `flush_interval` seconds by a thread of the process.
+        Nothing is written if the metrics did not change.
+        '''
+        with self.lock:
+            if self.directory is None or not self.changed:
+                return
+            self.changed = False
+            path = self.path
+        data = json.dumps(self.snapshot(), separators=(',', ':'))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        '''Returns the metrics of every process sharing the directory.
+
+        Only the snapshots are read, including that of this process, so
+        that every process serves the same sums.
+
+        Returns
+        -------
+        CallbackMetrics
+            Return the sum of the metrics of the processes, or the metrics
+            of this process if there is no shared directory
+        '''
+        if self.directory is None:
+            return self
+        total = CallbackMetrics()
+        for filename in sorted(os.listdir(self.directory)):
+            if not (filename.startswith('callbacks-')
+                    and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    total.merge(json.load(f))
+            except (OSError, ValueError):
+                # removed or being replaced
+                continue
+        return total
+
+    def render(self):
+        '''Returns the metrics in the Prometheus text format.'''
+        metrics = self.collect()
+        with metrics.lock:
+            lines = ['# TYPE dash_callback_calls_total counter']
+            for name, count in sorted(metrics.calls.items()):
+                lines.append('dash_callback_calls_total{{callback="{}"}} {}'
+                             .format(name, count))
+            lines.append('# TYPE dash_callback_errors_total counter')
+            for name, count in sorted(metrics.errors.items()):
+                lines.append('dash_callback_errors_total{{callback="{}"}} {}'
+                             .format(name, count))
+            for metric, attribute, _ in HISTOGRAMS:
+                lines.append('# TYPE {} histogram'.format(metric))
+                for name, histogram in sorted(
+                        getattr(metrics, attribute).items()):
+                    lines.extend(histogram.lines(
+                        metric, 'callback="{}"'.format(name)))
+            lines.append('# TYPE dash_callback_input_total counter')
+            for (name, input), counts in sorted(
+                    metrics.input_values.items()):
+                for value, count in sorted(counts.items(), key=str):
+                    lines.append(
+                        'dash_callback_input_total{{callback="{}",input="{}",'
+                        'value="{}"}} {}'.format(
+                            name, input,
+                            str(value).replace('\\', '\\\\')
+                                      .replace('"', '\\"'), count))
+        return '\n'.join(lines) + '\n'
+
+
+def instrument(app, metrics=None):
+    '''Instruments the server callbacks of a Dash app.
+
+    Replaces `app.callback` so that every callback registered afterwards is
+    measured, and adds the `/metrics` endpoint to the Flask server of the
+    app. Must be called before the callbacks are registered.
+
+    Parameters
+    ----------
+    app : dash.Dash
+        The Dash app.
+    metrics : CallbackMetrics, optional
+        The metrics collector. A new one is created if not given.
+
+    Returns
+    -------
+    CallbackMetrics
+        Return the metrics collector
+    '''
+    metrics = metrics or CallbackMetrics()
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        registered = set(app.callback_map)
+        decorator = register(*args, **kwargs)
+        callback_ids = set(app.callback_map) - registered
+
+        def wrap(func):
+            decorator(metrics.timed(func))
+            for callback_id in callback_ids:
+                entry = app.callback_map[callback_id]
+                inputs = ['{id}.{property}'.format(**input)
+                          for input in entry['inputs']]
+                entry['callback'] = metrics.measured(
+                    func.__name__, inputs, entry['callback'])
+            return func
+        return wrap
+
+    app.callback = callback
+    app.server.add_url_rule(
+        '/metrics', 'metrics',
+        lambda: Response(metrics.render(),
+                         mimetype='text/plain; version=0.0.4'))
+    return metrics
@@ -0,0 +1,159 @@
+'''HTTP caching and compression of the Flask server responses.
+
+`optimize_responses` adds weak ETags to GET responses, answering matching
+conditional requests with `304 Not Modified`, and compresses responses with
+brotli (if installed) or gzip. `cached_response` builds the response of a
+content-addressed payload that browsers and reverse proxies can cache.
+'''
+import gzip
+import threading
+import collections
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# responses smaller than this are sent uncompressed
+MIN_SIZE = 500
+# number of compressed GET bodies kept, keyed by ETag and encoding
+CACHE_SIZE = 64
+# mimetypes that are compressed
+COMPRESSIBLE = ('application/json', 'application/javascript', 'text/html',
+                'text/css', 'text/javascript', 'text/plain', 'image/svg+xml')
+
+
+def compress(data, encoding):
+    '''Compresses data with the gzip or brotli encoding.'''
+    if encoding == 'br':
+        return brotli.compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+_compressed = collections.OrderedDict()
+_compressed_lock = threading.Lock()
+
+
+def compress_cached(data, encoding, etag):
+    '''Compresses data, reusing the result for the same ETag.
+
+    Used for GET responses such as the Dash component bundles, which would
+    otherwise be compressed again on every request.
+    '''
+    key = (etag, encoding)
+    with _compressed_lock:
+        if key in _compressed:
+            _compressed.move_to_end(key)
+            return _compressed[key]
+    result = compress(data, encoding)
+    with _compressed_lock:
+        _compressed[key] = result
+        while len(_compressed) > CACHE_SIZE:
+            _compressed.popitem(last=False)
+    return result
+
+
+def encodings(data):
+    '''Returns the compressed versions of data keyed by encoding.'''
+    encoded = {'gzip': compress(data, 'gzip')}
+    if brotli is not None:
+        encoded['br'] = compress(data, 'br')
+    return encoded
+
+
+def accepted_encoding():
+    '''Returns the best encoding accepted by the client, or None.'''
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def optimize_responses(server, min_size=MIN_SIZE):
+    '''Adds ETags and compression to the responses of a Flask server.
+
+    ETags are computed on the uncompressed body and are weak, so that the
+    same ETag is valid for every encoding of a response.
+
+    Parameters
+    ----------
+    server : flask.Flask
+        The Flask server.
+    min_size : int, optional
+        The size in bytes from which responses are compressed.
+    '''
+    @server.after_request
+    def after_request(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code != 200):
+            # e.g. static files, which are served with their own ETags
+            return response
+
+        etag = None
+        if request.method == 'GET' and 'ETag' not in response.headers:
+            response.add_etag(weak=True)
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+            etag = response.get_etag()[0]
+
+        encoding = accepted_encoding()
+        if (encoding is None or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE
+                or response.content_length < min_size):
+            return response
+        if etag is None:
+            data = compress(response.get_data(), encoding)
+        else:
+            data = compress_cached(response.get_data(), encoding, etag)
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def cached_response(data, etag, encoded=None, max_age=3600, immutable=False,
+                    mimetype='application/json'):
+    '''Returns a cacheable response, of JSON by default.
+
+    Parameters
+    ----------
+    data : bytes
+        The body, e.g. JSON.
+    etag : str
+        The ETag identifying the body, e.g. built from the data version and
+        the parameters of the payload.
+    encoded : dict, optional
+        Compressed bodies keyed by encoding, sent instead of compressing
+        `data` on every request.
+    max_age : int, optional
+        How long in seconds the response may be cached without revalidation.
+    immutable : bool, optional
+        Whether the body never changes for the URL of the response, e.g.
+        because the URL contains the version of the body, so that browsers
+        do not revalidate it even on reload.
+    mimetype : str, optional
+        The mimetype of the body.
+
+    Returns
+    -------
+    flask.Response
+        Return the response, or a `304 Not Modified` response if the client
+        already has it
+    '''
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable
+    response.vary.add('Accept-Encoding')
+    response.make_conditional(request)
+    encoding = accepted_encoding()
+    if response.status_code == 200 and encoded and encoding in encoded:
+        response.set_data(encoded[encoding])
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,80 @@
+'''Coalescing of concurrent calls computing the same result.
+
+When several threads ask for the same key at the same time, only the first
+one computes the result, and the others wait for it and share it instead of
+computing it again.
+'''
+import threading
+import functools
+
+
+class _Call(object):
+    '''A computation in progress.'''
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    '''Runs at most one computation per key at a time.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        '''Calls a function, or waits for the call in progress for a key.
+
+        Parameters
+        ----------
+        key : hashable
+            The key identifying the result.
+        func : callable
+            The function computing the result.
+
+        Returns
+        -------
+        object
+            Return the result of the function, shared by every caller that
+            asked for the key while it was computed
+        '''
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
+
+
+def single_flight(func):
+    '''Decorates a function so that concurrent calls with the same arguments
+    are coalesced into one.
+
+    The arguments must be hashable. Combined with `functools.lru_cache` on
+    top, a burst of requests for a result that is not cached yet computes it
+    only once.
+    '''
+    flight = SingleFlight()
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        return flight.do(args, func, *args)
+    return wrapper
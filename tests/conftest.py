@@ -0,0 +1,6 @@
+'''Makes the modules of the app importable by the tests.'''
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,50 @@
+import flask
+import pytest
+
+from dashboard import Dashboard, check_production, config_from_env
+
+from conftest import ROOT
+
+
+def create_server(tmp_path, **config):
+    config = dict(dict(csv=ROOT + '/GDP-clean.csv', store_dir=str(tmp_path),
+                       figure_cache=None, warm=False), **config)
+    return Dashboard(config).server
+
+
+def test_production_app_passes(tmp_path):
+    check_production(create_server(tmp_path))
+
+
+def test_production_app_from_the_environment(tmp_path):
+    config = config_from_env({'GDP_CSV': ROOT + '/GDP-clean.csv',
+                              'GDP_FIGURE_CACHE': '',
+                              'GDP_WARM_ON_IMPORT': 'False'})
+    config['store_dir'] = str(tmp_path)
+    check_production(Dashboard(config).server)
+
+
+def test_development_mode_fails(tmp_path):
+    server = create_server(tmp_path, mode='development')
+    with pytest.raises(RuntimeError, match='development mode'):
+        check_production(server)
+
+
+def test_flask_debug_mode_fails(tmp_path):
+    server = create_server(tmp_path)
+    server.debug = True
+    with pytest.raises(RuntimeError, match='Flask debug mode'):
+        check_production(server)
+
+
+def test_dash_dev_tools_fail(tmp_path):
+    server = create_server(tmp_path)
+    app = server.extensions['dashboard'].app
+    app.enable_dev_tools(debug=True)
+    with pytest.raises(RuntimeError, match='dev tool ui'):
+        check_production(server)
+
+
+def test_server_of_another_app_fails():
+    with pytest.raises(RuntimeError, match='not created by create_app'):
+        check_production(flask.Flask(__name__))
@@ -0,0 +1,176 @@
+import numpy as np
+import pytest
+
+from dashboard import Dashboard
+
+from conftest import ROOT
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    dashboard = Dashboard(dict(csv=ROOT + '/GDP-clean.csv',
+                               store_dir=str(tmp_path_factory.mktemp('store')),
+                               figure_cache=None, warm=False,
+                               clientside=False))
+    return dashboard.app.server.test_client()
+
+
+def get_json(client, url, **kwargs):
+    response = client.get(url, **kwargs)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_indicators(client):
+    indicators = get_json(client, '/api/indicators')
+    assert [indicator['key'] for indicator in indicators] == ['gdp']
+    indicator = get_json(client, '/api/gdp')
+    assert indicator['years'][0] == 1960
+    assert len(indicator['countries']) == 264
+
+
+def test_pagination(client):
+    pages = [get_json(client, '/api/gdp/years/2010',
+                      query_string=dict(offset=offset, limit=100))
+             for offset in (0, 100, 200)]
+    assert [page['total'] for page in pages] == [264] * 3
+    assert [page['next_offset'] for page in pages] == [100, 200, None]
+    assert [len(page['codes']) for page in pages] == [100, 100, 64]
+    codes = [code for page in pages for code in page['codes']]
+    assert len(set(codes)) == 264
+    # the default page size
+    page = get_json(client, '/api/gdp/years/2010')
+    assert page['codes'] == pages[0]['codes']
+    assert page['next_offset'] == 100
+
+
+def test_kind_filter(client):
+    page = get_json(client, '/api/gdp/years/2010?kind=income')
+    assert page['total'] == len(page['codes']) == 7
+    assert page['next_offset'] is None
+    page = get_json(client, '/api/gdp/block?kind=country&limit=50&start=2000')
+    assert page['total'] == 217
+    assert page['next_offset'] == 50
+    assert page['years'] == list(range(2000, 2018))
+    assert len(page['values']) == 18
+    assert all(len(row) == 50 for row in page['values'])
+
+
+def test_countries_filter(client):
+    page = get_json(client, '/api/gdp/block',
+                    query_string=dict(countries='USA,FRA', start=2010,
+                                      end=2011))
+    assert page['codes'] == ['USA', 'FRA']
+    assert page['years'] == [2010, 2011]
+    assert page['total'] == 2
+    assert page['next_offset'] is None
+    country = get_json(client, '/api/gdp/countries/FRA?start=2010&end=2011')
+    assert country['years'] == [2010, 2011]
+    assert [row[1] for row in page['values']] == country['values']
+
+
+@pytest.mark.parametrize('url', [
+    '/api/gdp/years/2010?limit=abc',
+    '/api/gdp/years/2010?limit=0',
+    '/api/gdp/years/2010?offset=-1',
+    '/api/gdp/years/2010?kind=planet',
+    '/api/gdp/years/2010?format=xml',
+    '/api/gdp/block?start=abc',
+])
+def test_invalid_parameters(client, url):
+    assert client.get(url).status_code == 400
+
+
+@pytest.mark.parametrize('url', [
+    '/api/population',
+    '/api/population/years/2010',
+    '/api/gdp/years/1800',
+    '/api/gdp/countries/XXX',
+    '/api/gdp/block?countries=USA,ZZZ',
+])
+def test_unknown(client, url):
+    assert client.get(url).status_code == 404
+
+
+def test_not_modified(client):
+    url = '/api/gdp/years/2010?limit=10'
+    response = client.get(url)
+    etag = response.headers['ETag']
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    # another request has another ETag
+    response = client.get('/api/gdp/years/2010?limit=20',
+                          headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_etags_change_with_the_indicators(tmp_path):
+    dashboard = Dashboard(dict(csv=ROOT + '/GDP-clean.csv',
+                               store_dir=str(tmp_path), figure_cache=None,
+                               warm=False, clientside=False))
+    client = dashboard.server.test_client()
+    indicators_etag = client.get('/api/indicators').headers['ETag']
+    year_etag = client.get('/api/gdp/years/2010').headers['ETag']
+
+    dashboard.indicators.register('population', ROOT + '/GDP-clean.csv',
+                                  title='Population')
+    response = client.get('/api/indicators',
+                          headers={'If-None-Match': indicators_etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
+
+    # the values are rounded to another precision
+    dashboard.indicators.register('gdp', ROOT + '/GDP-clean.csv',
+                                  title='GDP per capita', unit='USD',
+                                  prefix='$', decimals=0)
+    response = client.get('/api/gdp/years/2010',
+                          headers={'If-None-Match': year_etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != year_etag
+
+
+def test_arrow_without_pyarrow(client):
+    try:
+        import pyarrow  # noqa: F401
+        pytest.skip('pyarrow is installed')
+    except ImportError:
+        pass
+    assert client.get('/api/gdp/years/2010?format=arrow').status_code == 406
+    response = client.get('/api/gdp/years/2010', headers={
+        'Accept': 'application/vnd.apache.arrow.stream'})
+    assert response.status_code == 406
+
+
+def read_arrow(response):
+    pa = pytest.importorskip('pyarrow')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.apache.arrow.stream'
+    return pa.ipc.open_stream(response.data).read_all()
+
+
+def test_arrow_cross_section(client):
+    url = '/api/gdp/years/2010?kind=income&limit=5'
+    table = read_arrow(client.get(url + '&format=arrow'))
+    page = get_json(client, url)
+    assert table.column_names == ['code', 'value']
+    assert table.column('code').to_pylist() == page['codes']
+    # the float32 values of the matrix, which the JSON rounds to cents
+    np.testing.assert_allclose(table.column('value').to_numpy(),
+                               page['values'], atol=0.005)
+    # the Arrow stream is also chosen by the Accept header
+    table = read_arrow(client.get(url, headers={
+        'Accept': 'application/vnd.apache.arrow.stream'}))
+    assert table.column('code').to_pylist() == page['codes']
+
+
+def test_arrow_block(client):
+    url = '/api/gdp/block?countries=USA,FRA&start=2010&end=2012'
+    table = read_arrow(client.get(url + '&format=arrow'))
+    page = get_json(client, url)
+    assert table.column_names == ['year', 'USA', 'FRA']
+    assert table.column('year').to_pylist() == [2010, 2011, 2012]
+    np.testing.assert_allclose(
+        np.column_stack([table.column('USA').to_numpy(),
+                         table.column('FRA').to_numpy()]),
+        page['values'], atol=0.005)
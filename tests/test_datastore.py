@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pytest
+
+import datastore
+from datastore import DataMatrix, load_matrix
+
+CSV = """Country Name,Country Code,2000,2001
+France,FRA,{},2.5
+United States,USA,3,
+"""
+
+
+@pytest.fixture
+def matrix():
+    # 2000 and 2003 have no data
+    years = list(range(2000, 2008))
+    values = np.arange(2 * len(years), dtype='f4').reshape(len(years), 2)
+    values[[0, 3]] = np.nan
+    return DataMatrix(values, ['FRA', 'USA'], ['France', 'United States'],
+                      years)
+
+
+def test_kind_columns():
+    codes = ['FRA', 'HIC', 'WLD', 'USA', 'EMU', 'LIC']
+    matrix = DataMatrix(np.ones((1, len(codes)), dtype='f4'), codes, codes,
+                        [2000])
+    assert {kind: list(columns) for kind, columns in
+            matrix.kind_columns.items()} == dict(country=[0, 3],
+                                                 region=[2, 4],
+                                                 income=[1, 5])
+    assert matrix.country_codes == ['FRA', 'USA']
+
+
+def test_data_years(matrix):
+    assert matrix.data_years == [2001, 2002, 2004, 2005, 2006, 2007]
+
+
+@pytest.mark.parametrize('year, nearest', [
+    (2001, 2001),
+    (2007, 2007),
+    ('2005', 2005),
+    # 2003 has no data and is as near to 2002 as to 2004
+    (2003, 2002),
+    # 2000 has no data and 2001 is the first year with data
+    (2000, 2001),
+])
+def test_nearest_year(matrix, year, nearest):
+    assert matrix.nearest_year(year) == nearest
+
+
+@pytest.mark.parametrize('year, nearest', [
+    (1990, 2001),
+    (-1, 2001),
+    (2008, 2007),
+    (3000, 2007),
+])
+def test_nearest_year_out_of_range(matrix, year, nearest):
+    assert matrix.nearest_year(year) == nearest
+
+
+@pytest.mark.parametrize('year', [None, 'latest', '', [2005]])
+def test_nearest_year_of_other_values(matrix, year):
+    assert matrix.nearest_year(year) == 2007
+
+
+def test_tie_resolves_to_the_earlier_year():
+    values = np.ones((5, 1), dtype='f4')
+    values[1:4] = np.nan
+    matrix = DataMatrix(values, ['FRA'], ['France'], list(range(2000, 2005)))
+    assert matrix.nearest_year(2001) == 2000
+    assert matrix.nearest_year(2002) == 2000
+    assert matrix.nearest_year(2003) == 2004
+
+
+def write_csv(path, value=1):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(CSV.format(value))
+    return str(path)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    '''Records the CSV files whose store is built.'''
+    built = []
+    build_store = datastore.build_store
+
+    def counting_build_store(csv_path, store_dir):
+        built.append(csv_path)
+        return build_store(csv_path, store_dir)
+    monkeypatch.setattr(datastore, 'build_store', counting_build_store)
+    return built
+
+
+def test_store_is_built_once(tmp_path, builds):
+    csv_path = write_csv(tmp_path / 'gdp.csv')
+    store_dir = str(tmp_path / 'store')
+    matrix = load_matrix(csv_path, store_dir)
+    assert matrix.codes == ['FRA', 'USA']
+    assert matrix.years == [2000, 2001]
+    np.testing.assert_array_equal(matrix.values, [[1, 3], [2.5, np.nan]])
+    assert load_matrix(csv_path, store_dir).version == matrix.version
+    assert builds == [csv_path]
+
+
+def test_store_is_rebuilt_when_the_content_changes(tmp_path, builds):
+    csv_path = write_csv(tmp_path / 'gdp.csv')
+    store_dir = str(tmp_path / 'store')
+    version = load_matrix(csv_path, store_dir).version
+    write_csv(tmp_path / 'gdp.csv', value=7)
+    matrix = load_matrix(csv_path, store_dir)
+    assert matrix.values[0, 0] == 7
+    assert matrix.version != version
+    assert builds == [csv_path, csv_path]
+
+
+def test_store_is_kept_when_only_the_mtime_changes(tmp_path, builds,
+                                                   monkeypatch):
+    csv_path = write_csv(tmp_path / 'gdp.csv')
+    store_dir = str(tmp_path / 'store')
+    version = load_matrix(csv_path, store_dir).version
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_matrix(csv_path, store_dir).version == version
+    assert builds == [csv_path]
+    # the new modification time is stored, the content is not read again
+    digests = []
+    digest = datastore._digest
+    monkeypatch.setattr(datastore, '_digest',
+                        lambda path: digests.append(path) or digest(path))
+    assert load_matrix(csv_path, store_dir).version == version
+    assert digests == []
+
+
+@pytest.mark.parametrize('index', [None, '{"codes": [', '{}',
+                                   '{"source": [0, 0], "codes": []}'])
+def test_store_is_rebuilt_without_a_valid_index(tmp_path, builds, index):
+    csv_path = write_csv(tmp_path / 'gdp.csv')
+    store_dir = str(tmp_path / 'store')
+    version = load_matrix(csv_path, store_dir).version
+    _, index_path = datastore._store_paths(csv_path, store_dir)
+    if index is None:
+        os.remove(index_path)
+    else:
+        with open(index_path, 'w') as f:
+            f.write(index)
+    matrix = load_matrix(csv_path, store_dir)
+    assert matrix.version == version
+    assert matrix.codes == ['FRA', 'USA']
+    assert builds == [csv_path, csv_path]
+
+
+def test_csv_files_of_the_same_name(tmp_path, builds):
+    store_dir = str(tmp_path / 'store')
+    first = write_csv(tmp_path / 'a' / 'gdp.csv', value=1)
+    second = write_csv(tmp_path / 'b' / 'gdp.csv', value=2)
+    for _ in range(2):
+        assert load_matrix(first, store_dir).values[0, 0] == 1
+        assert load_matrix(second, store_dir).values[0, 0] == 2
+    assert builds == [first, second]
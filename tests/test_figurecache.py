@@ -0,0 +1,128 @@
+import os
+import itertools
+
+import pytest
+
+import figurecache
+from figurecache import FigureCache, figure_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    '''Makes every call of time.time in figurecache one second later.'''
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(figurecache.time, 'time', lambda: next(ticks))
+
+
+def keys(cache):
+    return sorted(row[0] for row in cache._connection().execute(
+        'SELECT key FROM figures'))
+
+
+def test_get_set(tmp_path):
+    cache = FigureCache(str(tmp_path / 'figures.sqlite'))
+    assert cache.get('a') is None
+    cache.set('a', b'{"x": 1}')
+    assert cache.get('a') == b'{"x": 1}'
+
+
+def test_without_path_stores_nothing():
+    cache = FigureCache(None)
+    cache.set('a', b'1')
+    assert cache.get('a') is None
+    assert cache.fetch('a', lambda: [1]) == b'[1]'
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = FigureCache(str(tmp_path / 'figures.sqlite'), max_bytes=30,
+                        access_resolution=0, size_check_interval=1)
+    for key in 'abc':
+        cache.set(key, b'x' * 10)
+    # a is used again, so b is now the least recently used
+    assert cache.get('a') is not None
+    cache.set('d', b'x' * 10)
+    assert keys(cache) == ['a', 'c', 'd']
+    cache.set('e', b'x' * 10)
+    assert keys(cache) == ['a', 'd', 'e']
+
+
+def test_access_time_is_coarse(tmp_path, clock):
+    cache = FigureCache(str(tmp_path / 'figures.sqlite'), max_bytes=30,
+                        access_resolution=60, size_check_interval=1)
+    for key in 'abc':
+        cache.set(key, b'x' * 10)
+    # read within the resolution, so a stays the least recently used
+    assert cache.get('a') is not None
+    cache.set('d', b'x' * 10)
+    assert keys(cache) == ['b', 'c', 'd']
+
+
+def test_size_checked_every_interval(tmp_path):
+    cache = FigureCache(str(tmp_path / 'figures.sqlite'), max_bytes=10,
+                        size_check_interval=3)
+    cache.set('a', b'x' * 10)
+    cache.set('b', b'x' * 10)
+    cache.set('c', b'x' * 10)
+    assert keys(cache) == ['a', 'b', 'c']
+    cache.set('d', b'x' * 10)
+    assert len(keys(cache)) == 1
+
+
+def test_key_changes_with_format_and_version(monkeypatch):
+    key = figure_key('map', 'gdp', 'v1', 2014, 0)
+    assert figure_key('map', 'gdp', 'v1', 2014, 0) == key
+    assert figure_key('map', 'gdp', 'v2', 2014, 0) != key
+    monkeypatch.setattr(figurecache, 'FORMAT', figurecache.FORMAT + 1)
+    assert figure_key('map', 'gdp', 'v1', 2014, 0) != key
+
+
+def test_fetch_builds_once(tmp_path):
+    cache = FigureCache(str(tmp_path / 'figures.sqlite'))
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {'data': [1.5]}
+
+    assert cache.fetch_figure('a', build) == {'data': [1.5]}
+    assert cache.fetch_figure('a', build) == {'data': [1.5]}
+    assert cache.fetch('a', build) == b'{"data":[1.5]}'
+    assert len(builds) == 1
+
+
+def test_fetch_reads_back_what_the_build_stored(tmp_path):
+    cache = FigureCache(str(tmp_path / 'figures.sqlite'))
+
+    def build():
+        return cache.fetch_figure('a', lambda: {'data': [1.5]})
+
+    assert cache.fetch('a', build) == b'{"data":[1.5]}'
+    assert cache.inserts == 1
+
+
+def test_connection_per_process(tmp_path, monkeypatch):
+    cache = FigureCache(str(tmp_path / 'figures.sqlite'))
+    connection = cache._connection()
+    assert cache._connection() is connection
+    pid = os.getpid()
+    monkeypatch.setattr(figurecache.os, 'getpid', lambda: pid + 1)
+    assert cache._connection() is not connection
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_forked_process_shares_the_cache(tmp_path):
+    cache = FigureCache(str(tmp_path / 'figures.sqlite'))
+    parent_connection = cache._connection()
+    cache.set('parent', b'1')
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            if cache._connection() is not parent_connection:
+                cache.set('child', b'2')
+                status = 0 if cache.get('parent') == b'1' else 1
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert cache.get('child') == b'2'
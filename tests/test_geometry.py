@@ -0,0 +1,30 @@
+import geometry
+from geometry import LEVELS, WorldGeometry, topology_name
+
+
+def test_version_changes_with_the_simplification(monkeypatch):
+    versions = {level: WorldGeometry().version(level) for level in LEVELS}
+    assert len(set(versions.values())) == len(LEVELS)
+    monkeypatch.setitem(geometry.LEVELS, 'coarse', LEVELS['coarse'] + 0.1)
+    changed = WorldGeometry()
+    assert changed.version('coarse') != versions['coarse']
+    assert changed.version('full') == versions['full']
+    assert changed.version('medium') == versions['medium']
+
+
+def test_served_versions(tmp_path):
+    from dashboard import Dashboard
+
+    dashboard = Dashboard(dict(store_dir=str(tmp_path), figure_cache=None,
+                               warm=False))
+    client = dashboard.server.test_client()
+    for level in LEVELS:
+        url = dashboard.graph_config(level)['topojsonURL']
+        assert dashboard.geometry.version(level) in url
+        response = client.get('{}{}.json'.format(url, topology_name(level)))
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+    # the version of another level is not served
+    response = client.get('/geometry/{}/coarse/{}.json'.format(
+        dashboard.geometry.version('full'), topology_name('coarse')))
+    assert response.status_code == 404
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from inequality import gini, inequality_statistics, percentile_ratio, theil
+
+from conftest import ROOT
+
+MEASURES = [gini, theil, percentile_ratio]
+
+
+def expanded(values, weights):
+    '''Repeats every value as many times as its integer weight.'''
+    rows = [np.repeat(row, row_weights)
+            for row, row_weights in zip(values, weights.astype(int))]
+    width = max(len(row) for row in rows)
+    return np.array([np.pad(row, (0, width-len(row)),
+                            constant_values=np.nan) for row in rows])
+
+
+@pytest.fixture
+def sample():
+    rng = np.random.RandomState(0)
+    values = rng.lognormal(8, 1, size=(5, 12))
+    values[1, 3] = np.nan
+    weights = rng.randint(1, 6, size=values.shape).astype(float)
+    return values, weights
+
+
+def test_known_weighted_gini():
+    # the distribution 1, 1, 1, 3
+    values = np.array([[1., 3.]])
+    assert gini(values, np.array([[3., 1.]]))[0] == pytest.approx(0.25)
+    assert gini(np.array([[1., 1., 1., 3.]]))[0] == pytest.approx(0.25)
+
+
+@pytest.mark.parametrize('measure', MEASURES)
+def test_integer_weights_repeat_the_values(measure, sample):
+    values, weights = sample
+    np.testing.assert_allclose(measure(values, weights),
+                               measure(expanded(values, weights)))
+
+
+@pytest.mark.parametrize('measure', MEASURES)
+def test_equal_weights_are_unweighted(measure, sample):
+    values, _ = sample
+    np.testing.assert_allclose(measure(values, np.full(values.shape, 7.)),
+                               measure(values))
+
+
+@pytest.mark.parametrize('measure', MEASURES)
+def test_missing_and_zero_weights_are_left_out(measure, sample):
+    values, weights = sample
+    weights[:, 0] = np.nan
+    weights[:, 1] = 0
+    np.testing.assert_allclose(measure(values, weights),
+                               measure(values[:, 2:], weights[:, 2:]))
+
+
+def test_equal_values():
+    values = np.full((2, 4), 5.)
+    weights = np.array([[1., 2., 3., 4.], [4., 3., 2., 1.]])
+    statistics = inequality_statistics(values, weights)
+    np.testing.assert_allclose(statistics['gini'], 0, atol=1e-12)
+    np.testing.assert_allclose(statistics['theil'], 0, atol=1e-12)
+    np.testing.assert_allclose(statistics['p90_p10'], 1)
+
+
+def test_years_with_less_than_two_weighted_values():
+    values = np.array([[1., 2., 3.], [1., 2., np.nan]])
+    weights = np.array([[1., 1., 1.], [1., np.nan, 1.]])
+    for measure in inequality_statistics(values, weights).values():
+        assert not np.isnan(measure[0])
+        assert np.isnan(measure[1])
+
+
+def test_population_weighted_figure(tmp_path):
+    from dashboard import Dashboard
+
+    # a population of 1 everywhere weighs every country equally
+    df = pd.read_csv(ROOT + '/GDP-clean.csv').dropna(subset=['Country Code'])
+    years = [column for column in df.columns if column.isdigit()]
+    df[years] = 1
+    population_csv = str(tmp_path / 'population.csv')
+    df.to_csv(population_csv, index=False)
+
+    dashboard = Dashboard(dict(csv=ROOT + '/GDP-clean.csv',
+                               store_dir=str(tmp_path), figure_cache=None,
+                               warm=False, typed_arrays=False))
+    assert len(dashboard.get_inequality_figure()['data']) == 3
+    dashboard.indicators.register('population', population_csv,
+                                  title='Population')
+    dashboard.get_inequality_figure.cache_clear()
+    data = dashboard.get_inequality_figure()['data']
+    assert len(data) == 6
+    for trace, weighted in zip(data[:3], data[3:]):
+        assert weighted['name'] == trace['name'] + ' (population-weighted)'
+        assert weighted['line']['dash'] == 'dash'
+        np.testing.assert_allclose(
+            np.array(weighted['y'], dtype=float),
+            np.array(trace['y'], dtype=float), equal_nan=True)
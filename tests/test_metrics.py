@@ -0,0 +1,101 @@
+import time
+
+import metrics
+from metrics import CallbackMetrics
+
+
+def record(collector, name='update_map', year=2010, latency=0.002):
+    collector.record(name, latency, 0.001, 1500, [('year-slider.value', year)])
+
+
+def sample(text, line):
+    '''Returns the value of a sample of the Prometheus text format.'''
+    for text_line in text.splitlines():
+        if text_line.startswith(line + ' '):
+            return float(text_line.split()[-1])
+    return None
+
+
+def test_process_metrics():
+    collector = CallbackMetrics()
+    record(collector)
+    record(collector, year=2011, latency=0.2)
+    collector.record_error('update_map')
+    text = collector.render()
+    assert sample(text, 'dash_callback_calls_total{callback="update_map"}') \
+        == 2
+    assert sample(text, 'dash_callback_errors_total{callback="update_map"}') \
+        == 1
+    assert sample(text, 'dash_callback_latency_seconds_bucket'
+                        '{callback="update_map",le="0.0025"}') == 1
+    assert sample(text, 'dash_callback_latency_seconds_count'
+                        '{callback="update_map"}') == 2
+    assert sample(text, 'dash_callback_input_total{callback="update_map",'
+                        'input="year-slider.value",value="2011"}') == 1
+
+
+def test_workers_are_summed(tmp_path):
+    # two workers sharing the directory, whichever one is scraped
+    workers = [CallbackMetrics(str(tmp_path), flush_interval=3600)
+               for _ in range(2)]
+    record(workers[0])
+    record(workers[0])
+    record(workers[1], name='update_histogram')
+    record(workers[1], latency=1)
+    for worker in workers:
+        worker.flush()
+    for worker in workers:
+        text = worker.render()
+        assert sample(text, 'dash_callback_calls_total'
+                            '{callback="update_map"}') == 3
+        assert sample(text, 'dash_callback_calls_total'
+                            '{callback="update_histogram"}') == 1
+        assert sample(text, 'dash_callback_latency_seconds_bucket'
+                            '{callback="update_map",le="+Inf"}') == 3
+        assert sample(text, 'dash_callback_latency_seconds_sum'
+                            '{callback="update_map"}') == 1.004
+        assert sample(text, 'dash_callback_input_total{callback="update_map",'
+                            'input="year-slider.value",value="2010"}') == 3
+
+
+def test_every_worker_serves_the_snapshots(tmp_path):
+    workers = [CallbackMetrics(str(tmp_path), flush_interval=3600)
+               for _ in range(2)]
+    line = 'dash_callback_calls_total{callback="update_map"}'
+    record(workers[0])
+    workers[0].flush()
+    record(workers[0])
+    record(workers[1])
+    # the calls that are not written yet are served by no worker, so the
+    # served counters are the same whichever worker is scraped
+    assert [sample(worker.render(), line) for worker in workers] == [1, 1]
+    for worker in workers:
+        worker.flush()
+    assert [sample(worker.render(), line) for worker in workers] == [3, 3]
+
+
+def test_snapshots_are_written_periodically(tmp_path):
+    worker = CallbackMetrics(str(tmp_path), flush_interval=0.01)
+    record(worker)
+    line = 'dash_callback_calls_total{callback="update_map"}'
+    deadline = time.time() + 5
+    while (sample(worker.render(), line) != 1
+           and time.time() < deadline):
+        time.sleep(0.01)
+    assert sample(worker.render(), line) == 1
+
+
+def test_forked_process_starts_from_zero(tmp_path, monkeypatch):
+    parent = CallbackMetrics(str(tmp_path), flush_interval=3600)
+    record(parent)
+    parent.flush()
+    pid = metrics.os.getpid()
+    monkeypatch.setattr(metrics.os, 'getpid', lambda: pid + 1)
+    record(parent)
+    parent.flush()
+    assert parent.calls == {'update_map': 1}
+    assert len(list(tmp_path.iterdir())) == 2
+    # the calls of the parent and of the child are both counted once
+    text = parent.render()
+    assert sample(text, 'dash_callback_calls_total'
+                        '{callback="update_map"}') == 2
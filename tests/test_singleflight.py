@@ -0,0 +1,110 @@
+import time
+import threading
+
+import pytest
+
+from singleflight import SingleFlight, single_flight
+
+WAITERS = 8
+
+
+class CountingEvent(threading.Event):
+    '''An event counting the threads waiting for it.'''
+
+    def __init__(self):
+        super(CountingEvent, self).__init__()
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def wait(self, timeout=None):
+        with self.lock:
+            self.waiting += 1
+        return super(CountingEvent, self).wait(timeout)
+
+
+def run_concurrently(flight, key, func):
+    '''Calls func through the flight from a leader and WAITERS threads.
+
+    The leader is held in func until every other thread waits for its
+    result, and the outcomes of all the threads are returned.
+    '''
+    entered = threading.Event()
+    release = threading.Event()
+    outcomes = []
+
+    def build():
+        entered.set()
+        assert release.wait(5)
+        return func()
+
+    def call():
+        try:
+            outcomes.append(('result', flight.do(key, build)))
+        except Exception as e:
+            outcomes.append(('error', e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert entered.wait(5)
+    event = flight.calls[key].event = CountingEvent()
+    threads += [threading.Thread(target=call) for _ in range(WAITERS)]
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.time() + 5
+    while event.waiting < WAITERS and time.time() < deadline:
+        time.sleep(0.001)
+    assert event.waiting == WAITERS
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_concurrent_callers_share_one_build():
+    flight = SingleFlight()
+    builds = []
+
+    def func():
+        builds.append(1)
+        return object()
+
+    outcomes = run_concurrently(flight, 'key', func)
+    assert len(builds) == 1
+    assert len(outcomes) == WAITERS + 1
+    assert len(set(id(result) for _, result in outcomes)) == 1
+    assert flight.calls == {}
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+    error = ValueError('no data')
+
+    def func():
+        raise error
+
+    outcomes = run_concurrently(flight, 'key', func)
+    assert outcomes == [('error', error)] * (WAITERS + 1)
+    # the failed call is forgotten, so the next caller tries again
+    assert flight.calls == {}
+    assert flight.do('key', lambda: 1) == 1
+
+
+def test_calls_after_a_flight_build_again():
+    builds = []
+
+    @single_flight
+    def square(x):
+        builds.append(x)
+        return x * x
+
+    assert square(3) == 9
+    assert square(3) == 9
+    assert square(4) == 16
+    assert builds == [3, 3, 4]
+
+
+def test_error_of_one_key_leaves_the_others():
+    flight = SingleFlight()
+    with pytest.raises(KeyError):
+        flight.do('a', lambda: {}['missing'])
+    assert flight.do('b', lambda: 'b') == 'b'
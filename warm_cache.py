@@ -0,0 +1,120 @@
+'''Pre-renders every figure of the app into the persistent figure cache.
+
+The map figure of every year and colorstyle, the histogram counts and the
+country trend series of every registered indicator are rendered in a pool
+of processes, one per core by default, and stored in the figure cache of
+the app (`GDP_FIGURE_CACHE`). Figures that are already cached for the
+current version of the data are skipped, so running it again is cheap.
+
+It is meant to be run once per release on hosts where the figure cache is
+on a persistent disk, so that the workers start with a warm cache and no
+user request pays for rendering a figure. It is not run by the Procfile:
+the filesystem of a Heroku dyno is ephemeral, so there the gunicorn master
+builds the figures while it preloads the app, within a time budget that
+fits in the boot timeout of the dyno (see gunicorn.conf.py).
+
+Usage
+-----
+    python warm_cache.py
+    python warm_cache.py --processes 4 --indicator gdp
+'''
+import os
+import time
+import argparse
+import multiprocessing
+
+from dashboard import Dashboard, colorscales, config_from_env, first_year
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# the dashboard of the current process
+dashboard = None
+
+
+def warm_tasks(keys):
+    '''Returns the figures to render for a list of indicators.
+
+    Parameters
+    ----------
+    keys : list of str
+        The keys of the indicators.
+
+    Returns
+    -------
+    list of tuple
+        Return one task per figure, starting with the figure type
+    '''
+    tasks = []
+    for key in keys:
+        matrix = dashboard.indicators.matrix(key)
+        tasks.append(('histograms', key))
+        tasks.append(('trends', key))
+        for year in matrix.data_years:
+            if year < first_year:
+                continue
+            for colorstyle in colorscales:
+                tasks.append(('map', key, year, colorstyle))
+    return tasks
+
+
+def init_process(config):
+    '''Creates the dashboard of a pool process, unless it was forked.'''
+    global dashboard
+    if dashboard is None:
+        dashboard = Dashboard(config)
+
+
+def render(task):
+    '''Renders a figure into the figure cache, if it is not cached yet.'''
+    figure_type, indicator = task[:2]
+    if figure_type == 'map':
+        dashboard.get_map_figure(task[2], task[3], indicator)
+    elif figure_type == 'histograms':
+        dashboard.get_histograms(indicator)
+    elif figure_type == 'trends':
+        dashboard.get_trend_series(indicator)
+    return figure_type
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='size of the process pool (default: all cores)')
+    parser.add_argument('--indicator', action='append',
+                        help='indicator to warm, may be repeated '
+                             '(default: all registered indicators)')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    # the figures are built by the pool instead of when the dashboard is
+    # created, and the client-side data is not needed
+    config = config_from_env()
+    config.update(warm=False, clientside=False)
+    if config['figure_cache'] is None:
+        print('The figure cache is disabled, nothing to warm')
+        return
+    init_process(config)
+
+    keys = args.indicator or list(dashboard.indicators.indicators)
+    unknown = [key for key in keys if key not in dashboard.indicators]
+    if unknown:
+        parser.error('unknown indicators: {}'.format(', '.join(unknown)))
+
+    start = time.perf_counter()
+    tasks = warm_tasks(keys)
+    # the pool processes share the memory-mapped matrices and write to the
+    # same SQLite cache, each with its own connection
+    with multiprocessing.Pool(args.processes, init_process,
+                              (config,)) as pool:
+        done = list(pool.imap_unordered(render, tasks, chunksize=8))
+    counts = {figure_type: done.count(figure_type)
+              for figure_type in sorted(set(done))}
+    print('Warmed {} figures ({}) of {} in {:.1f}s into {}'.format(
+        len(done), ', '.join('{} {}'.format(count, figure_type)
+                             for figure_type, count in counts.items()),
+        ', '.join(keys), time.perf_counter() - start,
+        dashboard.figure_cache.path))
+
+
+if __name__ == '__main__':
+    main()